@@ -1,14 +1,30 @@
 from openai import OpenAI
 from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor, Future, wait
 import os
 import json
 
+import explanation_cache
+
 # Load environment variables
 load_dotenv()
 
 # Initialize OpenAI client (reads OPENAI_API_KEY automatically)
 client = OpenAI()
 
+# Match explanations for /rank run concurrently on a shared pool, so the
+# number of in-flight OpenAI calls stays bounded across all requests
+EXPLANATION_CONCURRENCY = int(os.getenv("EXPLANATION_CONCURRENCY", "8"))
+EXPLANATION_TIMEOUT = float(os.getenv("EXPLANATION_TIMEOUT", "15"))    # seconds per OpenAI call
+EXPLANATION_DEADLINE = float(os.getenv("EXPLANATION_DEADLINE", "60"))  # seconds for one ranking
+_explanation_pool = ThreadPoolExecutor(max_workers=EXPLANATION_CONCURRENCY, thread_name_prefix="explain")
+
+# Bump whenever the dynamic match prompt changes, so cached explanations
+# produced by the old prompt are no longer used
+PROMPT_VERSION = "dynamic-match-v1"
+# Scores quoted in the prompt, hence part of the explanation cache key
+EXPLANATION_SCORE_FIELDS = ("semantic_similarity", "github_score", "leetcode_score", "final_score")
+
 
 # ==========================================================
 # Helper: Safe JSON Extraction
@@ -179,9 +195,38 @@ def generate_dynamic_match_explanation(
     semantic_similarity,
     github_score,
     leetcode_score,
-    final_score
+    final_score,
+    timeout=None
 ):
+    try:
+        return _request_dynamic_match_explanation(
+            job_description, student, semantic_similarity,
+            github_score, leetcode_score, final_score, timeout=timeout
+        )
+    except Exception as e:
+        print(f"Dynamic explanation failed: {e}")
+        return dict(FALLBACK_EXPLANATION)
+
+
+FALLBACK_EXPLANATION = {
+    "fit_summary": "Moderate alignment with role.",
+    "technical_alignment": "Partially aligned based on similarity score.",
+    "dsa_strength": "Adequate DSA capability.",
+    "gaps": "Further evaluation required.",
+    "verdict": "Moderate Fit"
+}
 
+
+def _request_dynamic_match_explanation(
+    job_description,
+    student,
+    semantic_similarity,
+    github_score,
+    leetcode_score,
+    final_score,
+    timeout=None
+):
+    """One OpenAI call for generate_dynamic_match_explanation; raises on failure"""
     skills = ", ".join(student.get("skills", []))
 
     prompt = f"""
@@ -213,34 +258,95 @@ Return ONLY valid JSON:
 }}
 """
 
+    # A timed-out call is not retried; the caller falls back instead
+    api = client.with_options(timeout=timeout, max_retries=0) if timeout else client
+    response = api.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[
+            {
+                "role": "system",
+                "content": "Be analytical and concise. Return only valid JSON."
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ],
+        temperature=0.4,
+        max_tokens=500
+    )
+
+    content = response.choices[0].message.content
+    return safe_json_parse(content)
+
+
+
+def _explain_and_cache(cache_key, job_description, timeout, candidate):
+    """Pool task: explain one candidate and cache it (fallbacks are not cached)"""
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "Be analytical and concise. Return only valid JSON."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            temperature=0.4,
-            max_tokens=500
-        )
-
-        content = response.choices[0].message.content
-        return safe_json_parse(content)
-
+        explanation = _request_dynamic_match_explanation(job_description, timeout=timeout, **candidate)
     except Exception as e:
         print(f"Dynamic explanation failed: {e}")
+        return dict(FALLBACK_EXPLANATION)
+    explanation_cache.put(cache_key, explanation, candidate["student"].get("numeric_id"), PROMPT_VERSION)
+    return explanation
 
-        return {
-            "fit_summary": "Moderate alignment with role.",
-            "technical_alignment": "Partially aligned based on similarity score.",
-            "dsa_strength": "Adequate DSA capability.",
-            "gaps": "Further evaluation required.",
-            "verdict": "Moderate Fit"
-        }
 
+def submit_dynamic_match_explanations(job_description, candidates, timeout=EXPLANATION_TIMEOUT):
+    """
+    Queue explanations on the shared pool (at most EXPLANATION_CONCURRENCY
+    OpenAI calls at once, each limited to `timeout` seconds).
+
+    candidates: list of dicts with the keyword arguments of
+    generate_dynamic_match_explanation (student, scores...).
+    Returns one future per candidate. Candidates explained before for the
+    same JD, profile version, scores and PROMPT_VERSION come back as already-completed
+    futures from the explanation cache, without an OpenAI call.
+    """
+    keys = [
+        explanation_cache.cache_key(
+            job_description, candidate["student"], PROMPT_VERSION,
+            scores=[candidate[name] for name in EXPLANATION_SCORE_FIELDS]
+        )
+        for candidate in candidates
+    ]
+    cached = explanation_cache.get_many(keys)
+
+    futures = []
+    for key, candidate in zip(keys, candidates):
+        if key in cached:
+            future = Future()
+            future.set_result(cached[key])
+        else:
+            future = _explanation_pool.submit(_explain_and_cache, key, job_description, timeout, candidate)
+        futures.append(future)
+    return futures
+
+
+def generate_dynamic_match_explanations(
+    job_description,
+    candidates,
+    timeout=EXPLANATION_TIMEOUT,
+    deadline=EXPLANATION_DEADLINE
+):
+    """
+    Explain many candidates concurrently and wait for them.
+
+    Returns a list aligned with candidates; entries still unfinished after
+    `deadline` seconds are None.
+    """
+    futures = submit_dynamic_match_explanations(job_description, candidates, timeout=timeout)
+    wait(futures, timeout=deadline)
+
+    explanations = []
+    for future in futures:
+        if future.done() and not future.cancelled() and future.exception() is None:
+            explanations.append(future.result())
+        else:
+            future.cancel()
+            explanations.append(None)
+
+    missing = explanations.count(None)
+    if missing:
+        print(f"⚠️ {missing}/{len(futures)} match explanations not ready within {deadline}s")
+    return explanations
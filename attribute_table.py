@@ -0,0 +1,212 @@
+import numpy as np
+from threading import Lock
+
+# ===============================
+# IN-MEMORY COLUMN STORE
+# ===============================
+# Numeric ranking features and filter attributes, one NumPy column per
+# field, row = numeric_id (ids come from a counter, so they are dense).
+# Kept in sync with db.students_collection so /rank can filter, score and
+# pick its top-k with array operations, going to Mongo only for the final
+# page of results.
+_COLUMNS = {
+    "present": (bool, False),
+    "github_score": ("float32", 0),
+    "coding_score": ("float32", 0),
+    "contest_rating": ("float32", 0),
+    "problems_solved": ("int32", 0),
+    "year": ("int16", -1),          # -1 = unknown
+    "branch_code": ("int16", -1),   # index into _branches, -1 = unknown
+}
+_columns = {name: np.full(0, default, dtype=dtype) for name, (dtype, default) in _COLUMNS.items()}
+_branches = []          # branch_code -> normalized branch
+_branch_codes = {}      # normalized branch -> branch_code
+_skills = {}            # numeric_id -> set of normalized skills
+_skill_ids = {}         # normalized skill -> set of numeric_ids
+attributes_lock = Lock()
+
+
+def _normalize_skill(skill):
+    return str(skill).strip().lower()
+
+
+def _row(student):
+    """Column values for one student document"""
+    github = student.get("github") or {}
+    leetcode = student.get("leetcode") or {}
+    solved = leetcode.get("problems_solved")
+    if isinstance(solved, dict):
+        solved = solved.get("total", 0)
+    elif solved is None:
+        # bulk uploads store easy/medium/hard at the top level
+        solved = sum(leetcode.get(k, 0) or 0 for k in ("easy", "medium", "hard"))
+    return {
+        "github_score": github.get("github_score", 0) or 0,
+        "coding_score": leetcode.get("coding_score", 0) or 0,
+        "contest_rating": leetcode.get("contest_rating", leetcode.get("rating", 0)) or 0,
+        "problems_solved": solved or 0,
+        "year": int(student["year"]) if student.get("year") is not None else -1,
+        "branch": str(student.get("branch") or "").strip().lower(),
+        "skills": {_normalize_skill(s) for s in student.get("skills") or [] if str(s).strip()},
+    }
+
+
+def _grow_unsafe(max_id):
+    size = len(_columns["present"])
+    if max_id < size:
+        return
+    new_size = max(max_id + 1, size * 2, 1024)
+    for name, (dtype, default) in _COLUMNS.items():
+        column = np.full(new_size, default, dtype=dtype)
+        column[:size] = _columns[name]
+        _columns[name] = column
+
+
+def _branch_code_unsafe(branch):
+    if not branch:
+        return -1
+    if branch not in _branch_codes:
+        _branch_codes[branch] = len(_branches)
+        _branches.append(branch)
+    return _branch_codes[branch]
+
+
+def _set_skills_unsafe(numeric_id, skills):
+    for skill in _skills.pop(numeric_id, ()):
+        _skill_ids[skill].discard(numeric_id)
+    if skills:
+        _skills[numeric_id] = skills
+        for skill in skills:
+            _skill_ids.setdefault(skill, set()).add(numeric_id)
+
+
+def _upsert_unsafe(students):
+    students = [s for s in students if "numeric_id" in s]
+    if not students:
+        return
+    _grow_unsafe(max(s["numeric_id"] for s in students))
+    for student in students:
+        numeric_id = student["numeric_id"]
+        row = _row(student)
+        _columns["present"][numeric_id] = True
+        for name in ("github_score", "coding_score", "contest_rating", "problems_solved", "year"):
+            _columns[name][numeric_id] = row[name]
+        _columns["branch_code"][numeric_id] = _branch_code_unsafe(row["branch"])
+        _set_skills_unsafe(numeric_id, row["skills"])
+
+
+def load(students):
+    """Replace the table with the attributes of the given student documents"""
+    global _branches, _branch_codes, _skills, _skill_ids
+    with attributes_lock:
+        for name, (dtype, default) in _COLUMNS.items():
+            _columns[name] = np.full(0, default, dtype=dtype)
+        _branches, _branch_codes, _skills, _skill_ids = [], {}, {}, {}
+        _upsert_unsafe(list(students))
+        count = int(_columns["present"].sum())
+    print(f"Attribute table loaded ({count} students).")
+
+
+def upsert(student):
+    """Add or refresh one student's attributes from its document"""
+    upsert_many([student])
+
+
+def upsert_many(students):
+    with attributes_lock:
+        _upsert_unsafe(students)
+
+
+def remove(numeric_id):
+    remove_many([numeric_id])
+
+
+def remove_many(numeric_ids):
+    with attributes_lock:
+        size = len(_columns["present"])
+        for numeric_id in numeric_ids:
+            if 0 <= numeric_id < size:
+                _columns["present"][numeric_id] = False
+            _set_skills_unsafe(numeric_id, set())
+
+
+def unknown_ids(numeric_ids):
+    """The given ids that have no row in the table"""
+    ids = np.asarray(numeric_ids, dtype="int64")
+    with attributes_lock:
+        present = _columns["present"]
+        known = (ids >= 0) & (ids < len(present))
+        known[known] = present[ids[known]]
+    return ids[~known]
+
+
+# ===============================
+# FILTER
+# ===============================
+def has_filters(branches=None, years=None, skills=None):
+    return bool(branches or years or skills)
+
+
+def matching_ids(branches=None, years=None, skills=None):
+    """numeric_ids whose branch is in `branches`, year in `years` and that
+    have every skill in `skills` (case-insensitive). Empty criteria match all.
+    """
+    with attributes_lock:
+        mask = _columns["present"].copy()
+        if branches:
+            codes = [_branch_codes[b] for b in {b.strip().lower() for b in branches} if b in _branch_codes]
+            mask &= np.isin(_columns["branch_code"], codes)
+        if years:
+            mask &= np.isin(_columns["year"], [int(y) for y in years])
+        if skills:
+            id_sets = [_skill_ids.get(_normalize_skill(s), set()) for s in skills]
+            allowed = set.intersection(*id_sets) if id_sets else set()
+            skill_mask = np.zeros(len(mask), dtype=bool)
+            skill_mask[[i for i in allowed if i < len(mask)]] = True
+            mask &= skill_mask
+    return np.flatnonzero(mask).astype("int64")
+
+
+# ===============================
+# SCORE
+# ===============================
+def hybrid_scores(numeric_ids, semantic, weights, top_k=None):
+    """Vectorized hybrid ranking of FAISS candidates.
+
+    final = semantic * w_semantic + github_score/100 * w_github
+            + coding_score/100 * w_leetcode
+    Candidates not in the table are dropped (callers load unknown_ids()
+    first, see main.hybrid_rank). Returns a dict of
+    aligned arrays (numeric_id, semantic, github_score, leetcode_score,
+    final_score), best first, cut to top_k.
+    """
+    semantic_weight, github_weight, leetcode_weight = weights
+    ids = np.asarray(numeric_ids, dtype="int64")
+    semantic = np.asarray(semantic, dtype="float32")
+
+    with attributes_lock:
+        size = len(_columns["present"])
+        in_range = (ids >= 0) & (ids < size)
+        ids, semantic = ids[in_range], semantic[in_range]
+        live = _columns["present"][ids]
+        ids, semantic = ids[live], semantic[live]
+        github = _columns["github_score"][ids] / 100
+        leetcode = _columns["coding_score"][ids] / 100
+
+    final = semantic * semantic_weight + github * github_weight + leetcode * leetcode_weight
+
+    # Top-k without sorting everything, then order just those
+    if top_k and top_k < len(final):
+        keep = np.argpartition(-final, top_k - 1)[:top_k]
+    else:
+        keep = np.arange(len(final))
+    order = keep[np.argsort(-final[keep], kind="stable")]
+
+    return {
+        "numeric_id": ids[order],
+        "semantic": semantic[order],
+        "github_score": github[order],
+        "leetcode_score": leetcode[order],
+        "final_score": final[order],
+    }
+
@@ -1,5 +1,5 @@
 from pymongo import MongoClient
-from datetime import datetime
+from datetime import datetime, timedelta
 import os
 
 # ----------------------------
@@ -13,6 +13,32 @@ COLLECTION_NAME = "students"
 client = MongoClient(MONGO_URI)
 db = client[DB_NAME]
 students_collection = db[COLLECTION_NAME]
+# Cached /rank match explanations (TTL index, see explanation_cache)
+explanations_collection = db["match_explanations"]
+
+# Writers stamp updated_at before their FAISS/section/attribute update
+# lands, so every "changed since" query looks back this much further
+# (re-applying a few upserts is harmless)
+UPDATED_AT_MARGIN = timedelta(seconds=int(os.getenv("UPDATED_AT_MARGIN", "300")))
+
+
+# ----------------------------
+# INDEXES
+# ----------------------------
+
+def ensure_indexes():
+    """Indexes behind the watermark catch-up (updated_at) and the numeric_id
+    lookups used by FAISS, the reconciler and ranking"""
+    try:
+        students_collection.create_index("updated_at")
+        students_collection.create_index(
+            "numeric_id",
+            unique=True,
+            partialFilterExpression={"numeric_id": {"$exists": True}}
+        )
+    except Exception as e:
+        # e.g. duplicate numeric_ids from before ids were reserved atomically
+        print(f"Student indexes not created: {e}")
 
 
 # ----------------------------
@@ -29,6 +55,17 @@ def get_next_numeric_id():
     return counter["seq"]
 
 
+def reserve_numeric_ids(count):
+    """Reserve `count` consecutive numeric ids in one round trip"""
+    counter = db["counters"].find_one_and_update(
+        {"_id": "student_id"},
+        {"$inc": {"seq": count}},
+        upsert=True,
+        return_document=True
+    )
+    return list(range(counter["seq"] - count + 1, counter["seq"] + 1))
+
+
 # ----------------------------
 # CREATE STUDENT
 # ----------------------------
@@ -49,10 +86,55 @@ def get_student_by_uuid(student_id):
 # GET STUDENTS BY NUMERIC IDS
 # ----------------------------
 
-def get_students_by_numeric_ids(numeric_ids):
-    return list(
-        students_collection.find({"numeric_id": {"$in": numeric_ids}})
-    )
+# Field projections for candidate fetches. "ranking" is what
+# attribute_table scores on, "card" what a /rank result row and its match
+# explanation read, "full" the whole document (embeddings included).
+STUDENT_PROJECTIONS = {
+    "ranking": {
+        "_id": 0, "numeric_id": 1, "branch": 1, "year": 1, "skills": 1,
+        "github.github_score": 1,
+        "leetcode.coding_score": 1,
+        "leetcode.contest_rating": 1,
+        "leetcode.rating": 1,
+        "leetcode.problems_solved": 1,
+        "leetcode.easy": 1,
+        "leetcode.medium": 1,
+        "leetcode.hard": 1,
+    },
+    "card": {
+        "_id": 0, "student_id": 1, "numeric_id": 1, "name": 1, "branch": 1, "year": 1, "skills": 1,
+        "master_summary": 1, "github_summary": 1, "leetcode_summary": 1,
+        "created_at": 1, "updated_at": 1,  # explanation cache key
+        "github.github_score": 1,
+        "github.profile_url": 1,
+        "github.statistics.total_repos": 1,
+        "github.statistics.total_stars": 1,
+        "github.languages": 1,
+        "leetcode.coding_score": 1,
+        "leetcode.profile_url": 1,
+        "leetcode.problems_solved": 1,
+        "leetcode.contest_rating": 1,
+        "resume.file_url": 1,
+        "linkedin.file_url": 1,
+    },
+    "full": None,
+}
+
+
+def get_students_by_numeric_ids(numeric_ids, profile="full"):
+    """Students for `numeric_ids` in the same order (missing ones skipped),
+    projected to one of STUDENT_PROJECTIONS, in a single query"""
+    if profile not in STUDENT_PROJECTIONS:
+        raise ValueError(f"Unknown projection profile: {profile}")
+    numeric_ids = list(numeric_ids)
+    if not numeric_ids:
+        return []
+    cursor = students_collection.find(
+        {"numeric_id": {"$in": numeric_ids}},
+        STUDENT_PROJECTIONS[profile]
+    ).batch_size(max(len(numeric_ids), 101))
+    by_id = {s["numeric_id"]: s for s in cursor}
+    return [by_id[i] for i in numeric_ids if i in by_id]
 
 
 # ----------------------------
@@ -81,3 +163,116 @@ def delete_student(student_id):
 def get_all_students():
     return list(students_collection.find())
 
+
+# ----------------------------
+# STREAM EMBEDDINGS (FOR FAISS STARTUP / REBUILD)
+# ----------------------------
+
+EMBEDDING_QUERY = {"numeric_id": {"$exists": True}, "embedding": {"$exists": True}}
+
+
+def iter_student_embeddings(since=None, batch_size=1000):
+    """Yield {"numeric_id", "embedding"} documents, streamed in cursor batches.
+
+    With `since`, only students updated after it (minus UPDATED_AT_MARGIN).
+    """
+    query = dict(EMBEDDING_QUERY)
+    if since is not None:
+        query["updated_at"] = {"$gt": since - UPDATED_AT_MARGIN}
+    cursor = students_collection.find(
+        query,
+        {"_id": 0, "numeric_id": 1, "embedding": 1}
+    ).batch_size(batch_size)
+    for student in cursor:
+        yield student
+
+
+def get_indexed_numeric_ids():
+    """numeric_id of every student that should be in FAISS (ids only)"""
+    cursor = students_collection.find(EMBEDDING_QUERY, {"_id": 0, "numeric_id": 1}).batch_size(10000)
+    return [s["numeric_id"] for s in cursor]
+
+
+def get_embeddings_by_numeric_ids(numeric_ids):
+    """Projected {numeric_id, embedding} for the given students"""
+    query = dict(EMBEDDING_QUERY)
+    query["numeric_id"] = {"$in": list(numeric_ids)}
+    return list(students_collection.find(query, {"_id": 0, "numeric_id": 1, "embedding": 1}))
+
+
+def count_students_with_embeddings():
+    return students_collection.count_documents(EMBEDDING_QUERY)
+
+
+def get_student_attributes(since=None):
+    """Projected filter attributes and numeric ranking features for every
+    indexed student (see attribute_table), or only those updated after `since`
+    (minus UPDATED_AT_MARGIN)"""
+    query = {"numeric_id": {"$exists": True}}
+    if since is not None:
+        query["updated_at"] = {"$gt": since - UPDATED_AT_MARGIN}
+    return students_collection.find(query, STUDENT_PROJECTIONS["ranking"]).batch_size(5000)
+
+
+
+# ----------------------------
+# SECTION EMBEDDINGS (PER-SECTION FAISS INDEXES)
+# ----------------------------
+
+SECTION_QUERY = {"numeric_id": {"$exists": True}, "section_embeddings": {"$exists": True}}
+
+
+def iter_section_embeddings(since=None, batch_size=1000):
+    """Yield {"numeric_id", "section_embeddings"} documents, streamed.
+
+    With `since`, only students updated after it (minus UPDATED_AT_MARGIN).
+    """
+    query = dict(SECTION_QUERY)
+    if since is not None:
+        query["updated_at"] = {"$gt": since - UPDATED_AT_MARGIN}
+    cursor = students_collection.find(
+        query,
+        {"_id": 0, "numeric_id": 1, "section_embeddings": 1}
+    ).batch_size(batch_size)
+    for student in cursor:
+        yield student
+
+
+def count_section_embeddings(sections):
+    """{section: number of students with a vector for it}, counted in a
+    single aggregation pass that only carries the section names"""
+    counts = dict.fromkeys(sections, 0)
+    cursor = students_collection.aggregate([
+        {"$match": SECTION_QUERY},
+        {"$project": {"_id": 0, "names": {
+            "$map": {"input": {"$objectToArray": "$section_embeddings"}, "in": "$$this.k"}
+        }}},
+        {"$unwind": "$names"},
+        {"$group": {"_id": "$names", "count": {"$sum": 1}}},
+    ])
+    for row in cursor:
+        if row["_id"] in counts:
+            counts[row["_id"]] = row["count"]
+    return counts
+
+
+# ----------------------------
+# EMBEDDING MODEL (RE-EMBEDDING)
+# ----------------------------
+
+settings_collection = db["settings"]
+reembed_jobs_collection = db["reembed_jobs"]
+
+
+def get_active_embedding_model():
+    """Model name the stored vectors were produced with, or None if never set"""
+    setting = settings_collection.find_one({"_id": "embedding_model"})
+    return setting["model"] if setting else None
+
+
+def set_active_embedding_model(model_name, tag):
+    settings_collection.update_one(
+        {"_id": "embedding_model"},
+        {"$set": {"model": model_name, "tag": tag, "updated_at": datetime.utcnow()}},
+        upsert=True
+    )
@@ -0,0 +1,223 @@
+import os
+import re
+import sqlite3
+import hashlib
+import numpy as np
+from collections import OrderedDict
+from threading import Lock
+
+# ===============================
+# CONFIG
+# ===============================
+CACHE_FILE = os.getenv("EMBEDDING_CACHE_FILE", "embedding_cache.db")  # "" = memory only
+CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Rows kept on disk; past this the oldest writes are pruned to 90% of it
+CACHE_MAX_ROWS = int(os.getenv("EMBEDDING_CACHE_MAX_ROWS", "200000"))
+
+# ===============================
+# STATE
+# ===============================
+# key -> float32 vector, least recently used first
+_memory = OrderedDict()
+_memory_bytes = 0
+_lock = Lock()  # memory LRU only; disk I/O never runs under it
+
+# Separate reader and writer connections on a WAL-mode database, so lookups
+# don't wait behind a writer's commit
+_read_db = None
+_write_db = None
+_read_lock = Lock()
+_write_lock = Lock()
+_disk_rows = 0  # upper bound on rows on disk, recounted before pruning
+
+cache_stats = {
+    "memory_hits": 0,
+    "disk_hits": 0,
+    "misses": 0,
+    "evictions": 0,
+    "disk_errors": 0,
+    "disk_pruned": 0,
+}
+
+
+def normalize_text(text):
+    """Whitespace-insensitive form of a text, so trivially different copies
+    of the same profile / JD share an entry"""
+    return re.sub(r"\s+", " ", str(text)).strip()
+
+
+def cache_key(model_name, text):
+    digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+    return f"{model_name}:{digest}"
+
+
+# ===============================
+# DISK STORE
+# ===============================
+def _connect():
+    db = sqlite3.connect(CACHE_FILE, check_same_thread=False)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    return db
+
+
+def _get_write_db_unsafe():
+    """Writer connection - MUST be called with _write_lock held"""
+    global _write_db, _disk_rows
+    if _write_db is None and CACHE_FILE:
+        _write_db = _connect()
+        _write_db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        _write_db.commit()
+        _disk_rows = _write_db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+    return _write_db
+
+
+def _get_read_db_unsafe():
+    """Reader connection - MUST be called with _read_lock held"""
+    global _read_db
+    if _read_db is None and CACHE_FILE:
+        with _write_lock:
+            _get_write_db_unsafe()  # creates the table
+        _read_db = _connect()
+    return _read_db
+
+
+def _disk_get(keys):
+    if not CACHE_FILE or not keys:
+        return {}
+    try:
+        found = {}
+        keys = list(keys)
+        with _read_lock:
+            db = _get_read_db_unsafe()
+            # Stay under sqlite's bound-parameter limit
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                rows = db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype="float32").copy()
+        return found
+    except sqlite3.Error as e:
+        cache_stats["disk_errors"] += 1
+        print(f"Embedding cache read failed: {e}")
+        return {}
+
+
+def _prune_unsafe(db):
+    """Drop the oldest writes (lowest rowids) down to 90% of CACHE_MAX_ROWS"""
+    global _disk_rows
+    _disk_rows = db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+    excess = _disk_rows - int(CACHE_MAX_ROWS * 0.9)
+    if _disk_rows <= CACHE_MAX_ROWS or excess <= 0:
+        return
+    db.execute(
+        "DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY rowid LIMIT ?)",
+        (excess,)
+    )
+    _disk_rows -= excess
+    cache_stats["disk_pruned"] += excess
+
+
+def _disk_put(items):
+    global _disk_rows
+    if not CACHE_FILE or not items:
+        return
+    try:
+        with _write_lock:
+            db = _get_write_db_unsafe()
+            # REPLACE gives rewritten keys a new rowid, so rowid order is write order
+            db.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, np.asarray(vector, dtype="float32").tobytes()) for key, vector in items.items()]
+            )
+            _disk_rows += len(items)
+            if _disk_rows > CACHE_MAX_ROWS:
+                _prune_unsafe(db)
+            db.commit()
+    except sqlite3.Error as e:
+        cache_stats["disk_errors"] += 1
+        print(f"Embedding cache write failed: {e}")
+
+
+# ===============================
+# MEMORY LRU
+# ===============================
+def _remember_unsafe(key, vector):
+    global _memory_bytes
+    old = _memory.pop(key, None)
+    if old is not None:
+        _memory_bytes -= old.nbytes
+    _memory[key] = vector
+    _memory_bytes += vector.nbytes
+    while _memory_bytes > CACHE_MAX_BYTES and _memory:
+        _, evicted = _memory.popitem(last=False)
+        _memory_bytes -= evicted.nbytes
+        cache_stats["evictions"] += 1
+
+
+# ===============================
+# PUBLIC API
+# ===============================
+def get_many(keys):
+    """Cached vectors for the given keys: {key: vector} for the hits only"""
+    found = {}
+    with _lock:
+        for key in keys:
+            vector = _memory.get(key)
+            if vector is not None:
+                _memory.move_to_end(key)
+                found[key] = vector
+        cache_stats["memory_hits"] += len(found)
+
+    on_disk = _disk_get([k for k in keys if k not in found])
+
+    with _lock:
+        for key, vector in on_disk.items():
+            _remember_unsafe(key, vector)
+            found[key] = vector
+        cache_stats["disk_hits"] += len(on_disk)
+        cache_stats["misses"] += len(keys) - len(found)
+    return found
+
+
+def put_many(items):
+    """Store {key: vector} in memory and on disk"""
+    if not items:
+        return
+    items = {k: np.asarray(v, dtype="float32") for k, v in items.items()}
+    with _lock:
+        for key, vector in items.items():
+            _remember_unsafe(key, vector)
+    _disk_put(items)
+
+
+def clear():
+    """Drop every cached vector (e.g. after a model change)"""
+    global _memory_bytes, _disk_rows
+    with _lock:
+        _memory.clear()
+        _memory_bytes = 0
+    with _write_lock:
+        db = _get_write_db_unsafe()
+        if db is not None:
+            db.execute("DELETE FROM embeddings")
+            db.commit()
+            _disk_rows = 0
+
+
+def get_stats():
+    with _lock:
+        lookups = cache_stats["memory_hits"] + cache_stats["disk_hits"] + cache_stats["misses"]
+        hits = lookups - cache_stats["misses"]
+        return {
+            **cache_stats,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0,
+            "memory_entries": len(_memory),
+            "memory_bytes": _memory_bytes,
+            "max_memory_bytes": CACHE_MAX_BYTES,
+            "disk_file": CACHE_FILE or None,
+            "max_disk_rows": CACHE_MAX_ROWS,
+        }
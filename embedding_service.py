@@ -0,0 +1,337 @@
+import os
+import time
+import queue
+import numpy as np
+from collections import Counter
+from concurrent.futures import Future
+from threading import Lock, Thread, Event
+from sentence_transformers import SentenceTransformer
+
+import embedding_cache
+
+# ===============================
+# CONFIG
+# ===============================
+MODEL_NAME = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+# torch = SentenceTransformer, onnx = ONNX Runtime (see onnx_backend)
+BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+DIMENSION = 384  # all-MiniLM-L6-v2 embedding size
+ENCODE_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+
+# Micro-batching: concurrent encode calls wait up to BATCH_WINDOW_MS for
+# company and are encoded together, up to MAX_BATCH_SIZE texts per batch.
+# A window of 0 disables the dispatcher (every call encodes directly).
+BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5"))
+MAX_BATCH_SIZE = int(os.getenv("EMBEDDING_MAX_BATCH_SIZE", "64"))
+
+# Long profiles: the model truncates at 256 word pieces, so they are split
+# into token-bounded chunks (with overlap) whose vectors are pooled.
+# mean = plain average, weighted = weighted by each chunk's token count
+CHUNK_TOKENS = int(os.getenv("EMBEDDING_CHUNK_TOKENS", "254"))  # 256 - [CLS]/[SEP]
+CHUNK_OVERLAP = int(os.getenv("EMBEDDING_CHUNK_OVERLAP", "32"))
+PROFILE_POOLING = os.getenv("EMBEDDING_PROFILE_POOLING", "weighted")
+
+# Reuse vectors for texts encoded before (see embedding_cache)
+CACHE_ENABLED = os.getenv("EMBEDDING_CACHE", "1") == "1"
+
+# ===============================
+# MODEL (ONE PER PROCESS, LOADED LAZILY)
+# ===============================
+_model = None
+_model_lock = Lock()
+_ready = Event()
+_warm_thread = None
+
+
+def model_tag(model_name=None):
+    """Identifies which model/backend produced a vector (cache keys, the
+    embedding_model field on students). Quantized ONNX output differs
+    slightly, so it gets its own tag."""
+    model_name = model_name or MODEL_NAME
+    if BACKEND == "onnx":
+        from onnx_backend import ONNX_QUANTIZE
+        return f"{model_name}:onnx{'-int8' if ONNX_QUANTIZE else ''}"
+    return model_name
+
+
+def load_model(model_name):
+    """A new, unshared model instance (e.g. to re-embed with a candidate model)"""
+    if BACKEND == "onnx":
+        from onnx_backend import OnnxEncoder
+        return OnnxEncoder(model_name)
+    if BACKEND != "torch":
+        raise ValueError(f"Unknown EMBEDDING_BACKEND '{BACKEND}'")
+    return SentenceTransformer(model_name)
+
+
+def use_model(model_name, model=None):
+    """Switch every caller to another model. With `model` (already loaded
+    via load_model) the switch is instant, otherwise it loads lazily."""
+    global MODEL_NAME, _model
+    with _model_lock:
+        MODEL_NAME = model_name
+        _model = model
+        if model is None:
+            _ready.clear()
+    print(f"Embedding model switched to {model_name}.")
+
+
+def get_model():
+    """Load the embedding model on first use; every caller shares it"""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                print(f"Loading embedding model {MODEL_NAME} ({BACKEND})...")
+                _model = load_model(MODEL_NAME)
+                _ready.set()
+                print("Embedding model loaded.")
+    return _model
+
+
+def _warm():
+    try:
+        # First encode also initializes tokenizer/kernels, not just weights
+        encode_one("warm up")
+    except Exception as e:
+        print(f"Embedding model warm-up failed: {e}")
+
+
+def warm_up():
+    """Load and exercise the model in a background thread (idempotent)"""
+    global _warm_thread
+    if _ready.is_set() or (_warm_thread is not None and _warm_thread.is_alive()):
+        return
+    _warm_thread = Thread(target=_warm, name="embedding-warmup", daemon=True)
+    _warm_thread.start()
+
+
+def is_ready():
+    """True once the model is loaded and requests won't pay the load cost"""
+    return _ready.is_set()
+
+
+# ===============================
+# MICRO-BATCHING DISPATCHER
+# ===============================
+_requests = queue.Queue()
+_dispatcher = None
+_dispatcher_lock = Lock()
+
+batch_stats = {
+    "batches": 0,
+    "texts": 0,
+    "requests": 0,
+    "max_batch_size": 0,
+    "batch_sizes": Counter(),  # texts per model call -> number of calls
+}
+_stats_lock = Lock()
+
+
+def _record_batch(n_texts, n_requests):
+    with _stats_lock:
+        batch_stats["batches"] += 1
+        batch_stats["texts"] += n_texts
+        batch_stats["requests"] += n_requests
+        batch_stats["max_batch_size"] = max(batch_stats["max_batch_size"], n_texts)
+        batch_stats["batch_sizes"][n_texts] += 1
+
+
+def _collect_batch():
+    """Block for one request, then gather more until the window closes or
+    the batch is full. Returns a list of (texts, future)."""
+    first = _requests.get()
+    batch = [first]
+    size = len(first[0])
+    deadline = time.monotonic() + BATCH_WINDOW_MS / 1000
+    while size < MAX_BATCH_SIZE:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            item = _requests.get(timeout=remaining)
+        except queue.Empty:
+            break
+        batch.append(item)
+        size += len(item[0])
+    return batch
+
+
+def _dispatch_loop():
+    while True:
+        batch = _collect_batch()
+        texts = [t for item_texts, _ in batch for t in item_texts]
+        try:
+            vectors = _encode(texts)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            continue
+
+        _record_batch(len(texts), len(batch))
+        start = 0
+        for item_texts, future in batch:
+            end = start + len(item_texts)
+            future.set_result(vectors[start:end])
+            start = end
+
+
+def _ensure_dispatcher():
+    global _dispatcher
+    if _dispatcher is not None and _dispatcher.is_alive():
+        return
+    with _dispatcher_lock:
+        if _dispatcher is None or not _dispatcher.is_alive():
+            _dispatcher = Thread(target=_dispatch_loop, name="embedding-dispatcher", daemon=True)
+            _dispatcher.start()
+
+
+def get_batch_stats():
+    """Achieved batch sizes of the dispatcher, for /stats"""
+    with _stats_lock:
+        batches = batch_stats["batches"]
+        return {
+            "backend": BACKEND,
+            "batch_window_ms": BATCH_WINDOW_MS,
+            "max_batch_size_limit": MAX_BATCH_SIZE,
+            "batches": batches,
+            "requests": batch_stats["requests"],
+            "texts": batch_stats["texts"],
+            "avg_batch_size": round(batch_stats["texts"] / batches, 2) if batches else 0,
+            "max_batch_size": batch_stats["max_batch_size"],
+            "batch_size_histogram": dict(sorted(batch_stats["batch_sizes"].items())),
+            "queued": _requests.qsize(),
+        }
+
+
+# ===============================
+# ENCODE
+# ===============================
+def _encode(texts, model=None):
+    vectors = (model or get_model()).encode(
+        texts,
+        batch_size=ENCODE_BATCH_SIZE,
+        normalize_embeddings=True,
+        convert_to_numpy=True,
+        show_progress_bar=False
+    )
+    return np.asarray(vectors, dtype="float32")
+
+
+def _encode_batched(texts):
+    """Small requests go through the dispatcher and share a model call with
+    other concurrent callers; requests that fill a batch on their own are
+    encoded directly."""
+    if BATCH_WINDOW_MS <= 0 or len(texts) >= MAX_BATCH_SIZE:
+        vectors = _encode(texts)
+        _record_batch(len(texts), 1)
+        return vectors
+
+    _ensure_dispatcher()
+    future = Future()
+    _requests.put((texts, future))
+    return future.result()
+
+
+def encode_many(texts):
+    """Encode texts into an (n, 384) float32 array of L2-normalized vectors.
+
+    Texts seen before (same model, same text up to whitespace) are served
+    from the embedding cache; only the rest reach the model.
+    """
+    texts = list(texts)
+    if not texts:
+        return np.empty((0, DIMENSION), dtype="float32")
+    if not CACHE_ENABLED:
+        return _encode_batched(texts)
+
+    tag = model_tag()
+    keys = [embedding_cache.cache_key(tag, t) for t in texts]
+    found = embedding_cache.get_many(list(dict.fromkeys(keys)))
+
+    missing = {}
+    for key, text in zip(keys, texts):
+        if key not in found and key not in missing:
+            missing[key] = text
+    if missing:
+        vectors = _encode_batched(list(missing.values()))
+        encoded = dict(zip(missing.keys(), vectors))
+        if model_tag() == tag:  # not switched mid-call (see use_model)
+            embedding_cache.put_many(encoded)
+        found.update(encoded)
+
+    return np.vstack([found[key] for key in keys])
+
+
+def encode_one(text):
+    """Encode one text into a (384,) float32 L2-normalized vector"""
+    return encode_many([text])[0]
+
+
+# ===============================
+# LONG PROFILES (CHUNK + POOL)
+# ===============================
+def chunk_text(text, chunk_tokens=CHUNK_TOKENS, overlap=CHUNK_OVERLAP, model=None):
+    """Split text into pieces of at most chunk_tokens word pieces.
+
+    Returns [(chunk_text, n_tokens)]. Chunks are slices of the original text
+    (via the tokenizer's offsets), so nothing is re-spelled.
+    """
+    tokenizer = (model or get_model()).tokenizer
+    encoded = tokenizer(
+        text,
+        add_special_tokens=False,
+        return_offsets_mapping=True,
+        truncation=False,
+        verbose=False
+    )
+    offsets = encoded["offset_mapping"]
+    if len(offsets) <= chunk_tokens:
+        return [(text, len(offsets))] if text.strip() else []
+
+    step = max(1, chunk_tokens - overlap)
+    chunks = []
+    for start in range(0, len(offsets), step):
+        window = offsets[start:start + chunk_tokens]
+        chunks.append((text[window[0][0]:window[-1][1]], len(window)))
+        if start + chunk_tokens >= len(offsets):
+            break
+    return chunks
+
+
+def encode_profiles(texts, pooling=PROFILE_POOLING, model=None):
+    """Encode long texts into (n, 384) normalized vectors without truncation.
+
+    Every chunk of every text goes to the model in one encode_many call; each
+    text's chunk vectors are then pooled (mean or token-weighted) and
+    re-normalized. With `model`, that model is used directly (no cache, no
+    micro-batching).
+    """
+    texts = list(texts)
+    if not texts:
+        return np.empty((0, DIMENSION), dtype="float32")
+    if pooling not in ("mean", "weighted"):
+        raise ValueError(f"Unknown pooling '{pooling}'")
+
+    per_text = [chunk_text(t, model=model) or [(t, 1)] for t in texts]
+    all_chunks = [c for chunks in per_text for c, _ in chunks]
+    vectors = encode_many(all_chunks) if model is None else _encode(all_chunks, model=model)
+
+    pooled = np.empty((len(texts), DIMENSION), dtype="float32")
+    start = 0
+    for i, chunks in enumerate(per_text):
+        block = vectors[start:start + len(chunks)]
+        start += len(chunks)
+        if pooling == "weighted":
+            weights = np.array([n for _, n in chunks], dtype="float32")
+            pooled[i] = (block * weights[:, None]).sum(axis=0) / weights.sum()
+        else:
+            pooled[i] = block.mean(axis=0)
+
+    pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+    return pooled
+
+
+def encode_profile(text, pooling=PROFILE_POOLING):
+    """Single-text version of encode_profiles"""
+    return encode_profiles([text], pooling=pooling)[0]
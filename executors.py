@@ -0,0 +1,66 @@
+import os
+import asyncio
+import multiprocessing
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from threading import Lock
+
+# ===============================
+# CONFIG
+# ===============================
+# CPU-bound work that holds the GIL (PDF parsing). 0 = run it in the
+# thread pool instead (e.g. where forking workers isn't allowed)
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Blocking I/O (HTTP APIs, OpenAI, MongoDB) and embedding, which stays in
+# this process so every request shares one model and its micro-batches
+IO_WORKERS = int(os.getenv("IO_WORKERS", "32"))
+
+_cpu_pool = None
+_io_pool = None
+_pools_lock = Lock()
+
+
+def _get_cpu_pool():
+    global _cpu_pool
+    if _cpu_pool is None:
+        with _pools_lock:
+            if _cpu_pool is None:
+                # spawn, not fork: by now this process runs the checkpointer,
+                # reconciler, embedding dispatcher and torch/OpenMP threads,
+                # and a forked child can inherit one of their locks held
+                _cpu_pool = ProcessPoolExecutor(
+                    max_workers=CPU_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+    return _cpu_pool
+
+
+def _get_io_pool():
+    global _io_pool
+    if _io_pool is None:
+        with _pools_lock:
+            if _io_pool is None:
+                _io_pool = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="io")
+    return _io_pool
+
+
+async def run_cpu(fn, *args, **kwargs):
+    """Run a picklable, module-level function in the process pool"""
+    pool = _get_cpu_pool() if CPU_WORKERS > 0 else _get_io_pool()
+    return await asyncio.get_running_loop().run_in_executor(pool, partial(fn, *args, **kwargs))
+
+
+async def run_io(fn, *args, **kwargs):
+    """Run a blocking call in the thread pool so the event loop stays free"""
+    return await asyncio.get_running_loop().run_in_executor(_get_io_pool(), partial(fn, *args, **kwargs))
+
+
+def shutdown():
+    global _cpu_pool, _io_pool
+    with _pools_lock:
+        if _cpu_pool is not None:
+            _cpu_pool.shutdown(wait=True)
+            _cpu_pool = None
+        if _io_pool is not None:
+            _io_pool.shutdown(wait=True)
+            _io_pool = None
@@ -0,0 +1,92 @@
+import os
+import hashlib
+from datetime import datetime
+from threading import Lock
+
+from db import explanations_collection
+
+# ===============================
+# CONFIG
+# ===============================
+EXPLANATION_CACHE_TTL = int(os.getenv("EXPLANATION_CACHE_TTL", str(7 * 24 * 3600)))  # seconds
+CACHE_ENABLED = os.getenv("EXPLANATION_CACHE", "1") == "1"
+
+cache_stats = {"hits": 0, "misses": 0, "writes": 0, "errors": 0}
+_stats_lock = Lock()
+
+
+def _count(field, n=1):
+    with _stats_lock:
+        cache_stats[field] += n
+
+
+def cache_key(job_description, student, prompt_version, scores=()):
+    """Changes whenever the JD text, the student document (updated_at), the
+    prompt or the scores quoted in it change, so stale explanations are
+    simply never looked up. Scores are rounded to the 2 decimals the prompt
+    shows them with."""
+    jd_hash = hashlib.sha256(job_description.strip().encode("utf-8")).hexdigest()
+    version = student.get("updated_at") or student.get("created_at")
+    version = version.isoformat() if isinstance(version, datetime) else str(version)
+    rounded = ",".join(f"{score:.2f}" for score in scores)
+    raw = f"{prompt_version}|{jd_hash}|{student.get('numeric_id')}|{version}|{rounded}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def ensure_indexes():
+    """TTL index: MongoDB deletes entries EXPLANATION_CACHE_TTL after creation"""
+    try:
+        explanations_collection.create_index("created_at", expireAfterSeconds=EXPLANATION_CACHE_TTL)
+    except Exception as e:
+        # e.g. the index exists with another TTL; entries still expire by it
+        print(f"Explanation cache TTL index not updated: {e}")
+
+
+def get_many(keys):
+    """{key: explanation} for the cached keys, in one round trip"""
+    if not CACHE_ENABLED or not keys:
+        return {}
+    try:
+        found = {
+            doc["_id"]: doc["explanation"]
+            for doc in explanations_collection.find({"_id": {"$in": list(set(keys))}}, {"explanation": 1})
+        }
+    except Exception as e:
+        _count("errors")
+        print(f"Explanation cache read failed: {e}")
+        return {}
+    hits = sum(1 for key in keys if key in found)
+    _count("hits", hits)
+    _count("misses", len(keys) - hits)
+    return found
+
+
+def put(key, explanation, numeric_id=None, prompt_version=None):
+    if not CACHE_ENABLED:
+        return
+    try:
+        explanations_collection.replace_one(
+            {"_id": key},
+            {
+                "explanation": explanation,
+                "numeric_id": numeric_id,
+                "prompt_version": prompt_version,
+                "created_at": datetime.utcnow()
+            },
+            upsert=True
+        )
+        _count("writes")
+    except Exception as e:
+        _count("errors")
+        print(f"Explanation cache write failed: {e}")
+
+
+def get_stats():
+    with _stats_lock:
+        lookups = cache_stats["hits"] + cache_stats["misses"]
+        return {
+            **cache_stats,
+            "hit_rate": round(cache_stats["hits"] / lookups, 3) if lookups else 0,
+            "ttl_seconds": EXPLANATION_CACHE_TTL,
+            "enabled": CACHE_ENABLED,
+        }
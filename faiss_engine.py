@@ -1,7 +1,9 @@
 import os
 import faiss
 import numpy as np
-from sentence_transformers import SentenceTransformer
+
+from index_factory import new_index
+from embedding_service import encode_one
 
 # ===============================
 # CONFIG
@@ -9,11 +11,6 @@ from sentence_transformers import SentenceTransformer
 INDEX_FILE = "students.index"
 DIMENSION = 384  # all-MiniLM-L6-v2 embedding size
 
-# ===============================
-# LOAD MODEL ONCE
-# ===============================
-model = SentenceTransformer("all-MiniLM-L6-v2")
-
 # ===============================
 # LOAD OR CREATE INDEX
 # ===============================
@@ -23,8 +20,7 @@ def load_or_create_index():
         return faiss.read_index(INDEX_FILE)
     else:
         print("Creating new FAISS index...")
-        base_index = faiss.IndexFlatIP(DIMENSION)
-        return faiss.IndexIDMap(base_index)
+        return new_index("flat")
 
 index = load_or_create_index()
 
@@ -40,11 +36,8 @@ def save_index():
 # ADD STUDENT
 # ===============================
 def register_student(student_id: int, summary_text: str):
-    embedding = model.encode(summary_text)
-    vector = np.array([embedding]).astype("float32")
-
-    # Normalize for cosine similarity
-    faiss.normalize_L2(vector)
+    # encode_one returns an L2-normalized vector (cosine similarity)
+    vector = np.array([encode_one(summary_text)]).astype("float32")
 
     # Add with custom ID
     index.add_with_ids(vector, np.array([student_id]))
@@ -71,10 +64,7 @@ def match_jd(jd_text: str, top_k=5):
 
     top_k = min(top_k, index.ntotal)
 
-    embedding = model.encode(jd_text)
-    vector = np.array([embedding]).astype("float32")
-
-    faiss.normalize_L2(vector)
+    vector = np.array([encode_one(jd_text)]).astype("float32")
 
     scores, ids = index.search(vector, top_k)
 
@@ -64,3 +64,16 @@ def delete_student_files(file_paths):
 # AWS S3 SUPPORT (OPTIONAL)
 # ===================================
 
+
+
+def extract_pdf_text_from_disk(file_path):
+    """Extract text from PDF stored on disk (module-level so it can run in
+    the executors process pool)"""
+    try:
+        import pdfplumber
+        with pdfplumber.open(file_path) as pdf:
+            text = " ".join([page.extract_text() or "" for page in pdf.pages])
+        return text
+    except Exception as e:
+        print(f"PDF extraction error: {e}")
+        return ""
@@ -0,0 +1,315 @@
+import os
+import math
+import faiss
+import numpy as np
+
+# ===============================
+# CONFIG
+# ===============================
+DIMENSION = 384  # all-MiniLM-L6-v2 embedding size
+
+# flat | ivf_flat | ivf_pq | hnsw | auto
+INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "auto")
+
+# "auto" stays on exact flat search until the corpus reaches this size,
+# then promotes to AUTO_INDEX_TYPE
+AUTO_PROMOTE_THRESHOLD = int(os.getenv("FAISS_AUTO_PROMOTE_THRESHOLD", "20000"))
+AUTO_INDEX_TYPE = os.getenv("FAISS_AUTO_INDEX_TYPE", "ivf_flat")
+
+# IVF: 0 = pick nlist from corpus size (4 * sqrt(n))
+IVF_NLIST = int(os.getenv("FAISS_IVF_NLIST", "0"))
+PQ_M = int(os.getenv("FAISS_PQ_M", "48"))  # must divide DIMENSION
+PQ_NBITS = 8
+HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("FAISS_HNSW_EF_CONSTRUCTION", "80"))
+TRAIN_SAMPLE_SIZE = int(os.getenv("FAISS_TRAIN_SAMPLE_SIZE", "50000"))
+
+# Query-time defaults (overridable per search)
+DEFAULT_NPROBE = int(os.getenv("FAISS_NPROBE", "16"))
+DEFAULT_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "64"))
+
+# A filtered IVF/HNSW search only sees the ids inside the probed lists /
+# visited graph nodes, so a selective filter can return far fewer than k
+# hits. Filters up to this many ids are answered exactly instead (stored
+# vectors reconstructed and scored by dot product); larger ones widen
+# nprobe / efSearch so about FILTER_OVERSAMPLE * k matching ids are visited.
+EXACT_FILTER_MAX_IDS = int(os.getenv("FAISS_EXACT_FILTER_MAX_IDS", "5000"))
+FILTER_OVERSAMPLE = 2
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+# HNSW graphs cannot delete nodes, so removed/replaced entries get this id
+# in the IDMap and are excluded from searches until the next compaction
+TOMBSTONE_ID = -2
+HNSW_COMPACT_RATIO = 0.1
+_LIVE_ID_SELECTOR = faiss.IDSelectorRange(0, np.iinfo("int64").max)
+
+
+# ===============================
+# BUILD
+# ===============================
+def resolve_index_type(n_vectors):
+    """Index type to use for a corpus of n_vectors"""
+    if INDEX_TYPE == "auto":
+        return AUTO_INDEX_TYPE if n_vectors >= AUTO_PROMOTE_THRESHOLD else "flat"
+    if INDEX_TYPE not in INDEX_TYPES:
+        raise ValueError(f"Unknown FAISS_INDEX_TYPE '{INDEX_TYPE}'")
+    return INDEX_TYPE
+
+
+def _nlist_for(n_vectors):
+    if IVF_NLIST:
+        return IVF_NLIST
+    return max(1, int(4 * math.sqrt(n_vectors)))
+
+
+def _min_training_size(kind, n_vectors):
+    if kind == "ivf_flat":
+        return _nlist_for(n_vectors)
+    if kind == "ivf_pq":
+        return max(_nlist_for(n_vectors), 2 ** PQ_NBITS)
+    return 0
+
+
+def new_index(kind="flat"):
+    """Create an empty index that needs no training (flat or hnsw)"""
+    if kind == "flat":
+        return faiss.IndexIDMap(faiss.IndexFlatIP(DIMENSION))
+    if kind == "hnsw":
+        base = faiss.IndexHNSWFlat(DIMENSION, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        base.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        return faiss.IndexIDMap(base)
+    raise ValueError(f"Index type '{kind}' must be trained, use build_index()")
+
+
+def build_index(kind, vectors, ids):
+    """Build an index of the given type from normalized float32 vectors.
+
+    IVF variants are trained on (a sample of) the vectors themselves and
+    fall back to flat when there are too few to train on.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype="float32").reshape(-1, DIMENSION)
+    ids = np.asarray(ids, dtype="int64")
+    n = len(vectors)
+
+    if kind in ("ivf_flat", "ivf_pq"):
+        if n < _min_training_size(kind, n):
+            print(f"Only {n} vectors, not enough to train {kind}. Using flat index.")
+            kind = "flat"
+
+    if kind in ("flat", "hnsw"):
+        index = new_index(kind)
+    else:
+        nlist = _nlist_for(n)
+        quantizer = faiss.IndexFlatIP(DIMENSION)
+        if kind == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, DIMENSION, nlist, faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, DIMENSION, nlist, PQ_M, PQ_NBITS, faiss.METRIC_INNER_PRODUCT)
+        # IVF assigns ids natively; a hashtable direct map keeps reconstruct()
+        # working across add/remove
+        index.set_direct_map_type(faiss.DirectMap.Hashtable)
+
+        train = vectors
+        if n > TRAIN_SAMPLE_SIZE:
+            sample = np.random.default_rng(0).choice(n, TRAIN_SAMPLE_SIZE, replace=False)
+            train = vectors[sample]
+        index.train(train)
+        index.nprobe = DEFAULT_NPROBE
+
+    if n:
+        index.add_with_ids(vectors, ids)
+    return index
+
+
+# ===============================
+# INSPECT
+# ===============================
+def index_kind(index):
+    """Return 'flat', 'ivf_flat', 'ivf_pq' or 'hnsw' for an index built here"""
+    base = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else faiss.downcast_index(index)
+    if isinstance(base, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(base, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(base, faiss.IndexIVFFlat):
+        return "ivf_flat"
+    return "flat"
+
+
+def get_ids(index):
+    """All live student ids in the index"""
+    if isinstance(index, faiss.IndexIDMap):
+        id_map = faiss.vector_to_array(index.id_map)
+        return id_map[id_map >= 0]
+
+    ivf = faiss.extract_index_ivf(index)
+    invlists = ivf.invlists
+    ids = [
+        faiss.rev_swig_ptr(invlists.get_ids(l), invlists.list_size(l)).copy()
+        for l in range(invlists.nlist)
+        if invlists.list_size(l)
+    ]
+    return np.concatenate(ids) if ids else np.empty(0, dtype="int64")
+
+
+def get_vectors(index):
+    """(ids, vectors) for every live entry - lossy for ivf_pq"""
+    if isinstance(index, faiss.IndexIDMap):
+        id_map = faiss.vector_to_array(index.id_map)
+        vectors = index.index.reconstruct_n(0, index.ntotal) if index.ntotal else np.empty((0, DIMENSION), dtype="float32")
+        live = id_map >= 0
+        return id_map[live], vectors[live]
+
+    ids = get_ids(index)
+    vectors = np.vstack([index.reconstruct(int(i)) for i in ids]) if len(ids) else np.empty((0, DIMENSION), dtype="float32")
+    return ids, vectors
+
+
+def reconstruct_ids(index, ids):
+    """(ids, vectors) for the live entries among `ids` - lossy for ivf_pq"""
+    ids = np.unique(np.asarray(ids, dtype="int64"))
+    if isinstance(index, faiss.IndexIDMap):
+        id_map = faiss.vector_to_array(index.id_map)
+        positions = np.flatnonzero(np.isin(id_map, ids))
+        if not len(positions):
+            return np.empty(0, dtype="int64"), np.empty((0, DIMENSION), dtype="float32")
+        return id_map[positions], index.index.reconstruct_batch(positions)
+
+    # IVF: the hashtable direct map raises for ids it doesn't hold
+    found, vectors = [], []
+    for i in ids.tolist():
+        try:
+            vectors.append(index.reconstruct(i))
+        except RuntimeError:
+            continue
+        found.append(i)
+    if not found:
+        return np.empty(0, dtype="int64"), np.empty((0, DIMENSION), dtype="float32")
+    return np.array(found, dtype="int64"), np.vstack(vectors)
+
+
+def tombstone_count(index):
+    if index_kind(index) != "hnsw":
+        return 0
+    return int((faiss.vector_to_array(index.id_map) < 0).sum())
+
+
+def live_count(index):
+    return index.ntotal - tombstone_count(index)
+
+
+# ===============================
+# MUTATE / SEARCH
+# ===============================
+def remove_ids(index, ids):
+    """Remove ids from any supported index type"""
+    ids = np.asarray(ids, dtype="int64")
+    if index_kind(index) != "hnsw":
+        return index.remove_ids(ids)
+
+    id_map = faiss.vector_to_array(index.id_map)
+    mask = np.isin(id_map, ids)
+    removed = int(mask.sum())
+    if removed:
+        id_map[mask] = TOMBSTONE_ID
+        faiss.copy_array_to_vector(id_map, index.id_map)
+    return removed
+
+
+def needs_compaction(index):
+    return index_kind(index) == "hnsw" and tombstone_count(index) > HNSW_COMPACT_RATIO * max(index.ntotal, 1)
+
+
+def should_promote(index):
+    """True when "auto" mode has outgrown the current index type"""
+    if INDEX_TYPE != "auto":
+        return False
+    current = index_kind(index)
+    return current == "flat" and resolve_index_type(live_count(index)) != "flat"
+
+
+def rebuild(index, kind=None):
+    """Rebuild an index from its own live vectors (promotion / compaction)"""
+    ids, vectors = get_vectors(index)
+    return build_index(kind or index_kind(index), vectors, ids)
+
+
+def id_selector(ids):
+    """FAISS selector restricting a search to the given student ids"""
+    return faiss.IDSelectorBatch(np.ascontiguousarray(ids, dtype="int64"))
+
+
+def search_params(index, nprobe=None, ef_search=None, sel=None):
+    """Per-query search parameters for the index type, or None for an
+    unfiltered flat search. `sel` restricts the search to matching ids.
+
+    The caller must keep `sel` alive until the search returns.
+    """
+    kind = index_kind(index)
+    if kind in ("ivf_flat", "ivf_pq"):
+        params = faiss.SearchParametersIVF(nprobe=nprobe or DEFAULT_NPROBE)
+    elif kind == "hnsw":
+        params = faiss.SearchParametersHNSW(efSearch=ef_search or DEFAULT_EF_SEARCH)
+        # Tombstoned entries have negative ids; the batch selector never
+        # contains them, so only the unfiltered case needs the live-range check
+        sel = sel if sel is not None else _LIVE_ID_SELECTOR
+    elif sel is not None:
+        params = faiss.SearchParameters()
+    else:
+        return None
+    if sel is not None:
+        params.sel = sel
+    return params
+
+
+def exact_search(index, vectors, k, ids):
+    """Exact inner-product search restricted to `ids`, in index.search()
+    format (missing results have id -1)"""
+    found, stored = reconstruct_ids(index, ids)
+    scores = np.full((len(vectors), k), -np.finfo("float32").max, dtype="float32")
+    labels = np.full((len(vectors), k), -1, dtype="int64")
+    n = min(k, len(found))
+    if n:
+        sims = np.asarray(vectors, dtype="float32") @ stored.T
+        top = np.argpartition(-sims, n - 1, axis=1)[:, :n]
+        top = np.take_along_axis(top, np.argsort(-np.take_along_axis(sims, top, axis=1), axis=1), axis=1)
+        scores[:, :n] = np.take_along_axis(sims, top, axis=1)
+        labels[:, :n] = found[top]
+    return scores, labels
+
+
+def _widen_for_filter(index, kind, k, n_ids, nprobe, ef_search):
+    """nprobe / efSearch large enough to visit ~FILTER_OVERSAMPLE * k of the
+    n_ids filtered entries (assuming they are spread evenly)"""
+    selectivity = min(1.0, n_ids / max(live_count(index), 1))
+    wanted = FILTER_OVERSAMPLE * k / selectivity  # entries to visit
+    if kind in ("ivf_flat", "ivf_pq"):
+        nlist = faiss.extract_index_ivf(index).nlist
+        lists = math.ceil(wanted * nlist / max(index.ntotal, 1))
+        nprobe = min(nlist, max(nprobe or DEFAULT_NPROBE, lists))
+    elif kind == "hnsw":
+        ef_search = min(max(index.ntotal, 1), max(ef_search or DEFAULT_EF_SEARCH, math.ceil(wanted)))
+    return nprobe, ef_search
+
+
+def search(index, vectors, k, nprobe=None, ef_search=None, filter_ids=None):
+    """index.search() with nprobe/efSearch applied for this query only,
+    optionally evaluated only over `filter_ids`.
+
+    On IVF/HNSW a filter of up to EXACT_FILTER_MAX_IDS ids is searched
+    exactly; larger filters widen nprobe/efSearch by their selectivity, so
+    k is filled from matching ids.
+    """
+    kind = index_kind(index)
+    if filter_ids is not None and kind != "flat":
+        filter_ids = np.asarray(filter_ids, dtype="int64")
+        if len(filter_ids) <= EXACT_FILTER_MAX_IDS:
+            return exact_search(index, vectors, k, filter_ids)
+        nprobe, ef_search = _widen_for_filter(index, kind, k, len(filter_ids), nprobe, ef_search)
+    
+    sel = id_selector(filter_ids) if filter_ids is not None else None
+    params = search_params(index, nprobe=nprobe, ef_search=ef_search, sel=sel)
+    if params is None:
+        return index.search(vectors, k)
+    return index.search(vectors, k, params=params)
@@ -6,6 +6,13 @@ document.addEventListener("DOMContentLoaded", () => {
     const resultsDiv = document.getElementById("results");
     const topKInput = document.getElementById("topK");
 
+    // Open explanation streams of the current ranking, one per loaded page
+    // (closed on a new search)
+    let explanationStreams = [];
+    // Next page of the current ranking, null once everything is shown
+    let nextPageUrl = null;
+    let shownCount = 0;
+
     // ================= SAMPLE BUTTON =================
 
     sampleBtn.addEventListener("click", () => {
@@ -31,7 +38,7 @@ Nice to have:
     rankBtn.addEventListener("click", async () => {
 
         const jobDescription = jobDescInput.value.trim();
-        const topK = parseInt(topKInput.value) || 10;
+        const pageSize = parseInt(topKInput.value) || 10;
 
         if (!jobDescription) {
             alert("Please enter a job description.");
@@ -48,9 +55,16 @@ Nice to have:
             </div>
         `;
 
+        explanationStreams.forEach((stream) => stream.close());
+        explanationStreams = [];
+        nextPageUrl = null;
+        shownCount = 0;
+
         try {
 
-            const response = await fetch(`http://localhost:8000/rank?top_k=${topK}`, {
+            // The server ranks the whole pool but only loads the first page;
+            // explanations are streamed after
+            const response = await fetch(`http://localhost:8000/rank?top_k=100&page_size=${pageSize}&stream_explanations=true`, {
                 method: "POST",
                 headers: {
                     "Content-Type": "application/json"
@@ -66,7 +80,8 @@ Nice to have:
                 throw new Error(data.detail || "Ranking failed");
             }
 
-            displayResults(data.ranked_students);
+            displayResults(data.ranked_students, data.session_id);
+            showPage(data);
 
         } catch (error) {
 
@@ -83,9 +98,114 @@ Nice to have:
 
     });
 
+    // ================= PAGINATION =================
+
+    function showPage(data) {
+        nextPageUrl = data.next_url
+            ? `http://localhost:8000${data.next_url}&stream_explanations=true`
+            : null;
+
+        if (data.explanations_url) {
+            streamExplanations(data.explanations_url, data.session_id);
+        }
+
+        const loadMoreBtn = document.getElementById("loadMoreBtn");
+        if (loadMoreBtn) {
+            loadMoreBtn.style.display = nextPageUrl ? "" : "none";
+        }
+    }
+
+    async function loadMore() {
+
+        if (!nextPageUrl) {
+            return;
+        }
+
+        const loadMoreBtn = document.getElementById("loadMoreBtn");
+        loadMoreBtn.disabled = true;
+
+        try {
+            const response = await fetch(nextPageUrl);
+            const data = await response.json();
+
+            if (!response.ok) {
+                throw new Error(data.detail || "Could not load more candidates");
+            }
+
+            appendCandidates(data.ranked_students, data.session_id);
+            showPage(data);
+        } catch (error) {
+            alert(error.message);
+        } finally {
+            loadMoreBtn.disabled = false;
+        }
+    }
+
+    // ================= STREAM EXPLANATIONS =================
+
+    // Each page has its own session; its cards carry data-session so a
+    // stream only ever touches the page it belongs to
+    function explanationElement(sessionId, numericId) {
+        return document.querySelector(`#explanation-${numericId}[data-session="${sessionId}"]`);
+    }
+
+    function streamExplanations(url, sessionId) {
+
+        const stream = new EventSource(`http://localhost:8000${url}`);
+        explanationStreams.push(stream);
+
+        stream.addEventListener("explanation", (event) => {
+            const data = JSON.parse(event.data);
+            const target = explanationElement(sessionId, data.numeric_id);
+            if (target) {
+                target.innerHTML = formatExplanation(data.match_explanation);
+                target.classList.remove("explanation-pending");
+            }
+        });
+
+        stream.addEventListener("done", (event) => {
+            stream.close();
+            // Only this session's candidates: anything of theirs still
+            // pending was dropped by the server deadline
+            const data = JSON.parse(event.data);
+            data.numeric_ids.forEach((numericId) => {
+                const el = explanationElement(sessionId, numericId);
+                if (el && el.classList.contains("explanation-pending")) {
+                    el.innerHTML = formatExplanation(null);
+                    el.classList.remove("explanation-pending");
+                }
+            });
+        });
+
+        stream.onerror = () => {
+            // EventSource reconnects by itself (resuming via Last-Event-ID);
+            // give up only once the server has closed the session
+            if (stream.readyState === EventSource.CLOSED) {
+                stream.close();
+            }
+        };
+    }
+
+    function formatExplanation(explanation) {
+
+        if (!explanation) {
+            return `<span style="color:#9CA3AF;">Explanation unavailable.</span>`;
+        }
+
+        if (typeof explanation === "string") {
+            return explanation;
+        }
+
+        return `
+            <strong>${explanation.verdict || ""}</strong><br>
+            ${explanation.fit_summary || ""}
+            ${explanation.gaps ? `<br><em>Gaps:</em> ${explanation.gaps}` : ""}
+        `;
+    }
+
     // ================= DISPLAY RESULTS =================
 
-    function displayResults(candidates) {
+    function displayResults(candidates, sessionId) {
 
         if (!candidates || candidates.length === 0) {
             resultsDiv.innerHTML = `
@@ -97,14 +217,31 @@ Nice to have:
         }
 
         let html = `<h2 style="margin-top:40px;">Ranked Candidates</h2>`;
-        html += `<div class="candidates-grid">`;
+        html += `<div class="candidates-grid" id="candidatesGrid"></div>`;
+        html += `
+            <div style="text-align:center; margin-top:20px;">
+                <button id="loadMoreBtn" class="sample-btn" style="display:none;">Load more candidates</button>
+            </div>
+        `;
+        resultsDiv.innerHTML = html;
+
+        document.getElementById("loadMoreBtn").addEventListener("click", loadMore);
+        appendCandidates(candidates, sessionId);
+    }
+
+    function appendCandidates(candidates, sessionId) {
 
-        candidates.forEach((candidate, index) => {
+        const grid = document.getElementById("candidatesGrid");
+        let html = "";
+
+        candidates.forEach((candidate) => {
+
+            shownCount += 1;
 
             html += `
                 <div class="candidate-card">
                     <div style="display:flex; justify-content:space-between; align-items:center;">
-                        <h3>#${index + 1} ${candidate.name}</h3>
+                        <h3>#${shownCount} ${candidate.name}</h3>
                         <span style="font-weight:600; color:#4ECDC4;">
                             Score: ${candidate.final_score}
                         </span>
@@ -146,8 +283,13 @@ Nice to have:
 
                     <div style="margin-top:15px; padding:12px; background:#f9fafb; border-radius:8px;">
                         <strong>AI Explanation:</strong>
-                        <p style="margin-top:6px; font-size:14px;">
-                            ${candidate.match_explanation}
+                        <p id="explanation-${candidate.numeric_id}"
+                            data-session="${sessionId || ""}"
+                            class="${candidate.match_explanation ? "" : "explanation-pending"}"
+                            style="margin-top:6px; font-size:14px;">
+                            ${candidate.match_explanation
+                                ? formatExplanation(candidate.match_explanation)
+                                : `<i class="fa-solid fa-spinner fa-spin"></i> Generating explanation...`}
                         </p>
                     </div>
 
@@ -155,8 +297,7 @@ Nice to have:
             `;
         });
 
-        html += `</div>`;
-        resultsDiv.innerHTML = html;
+        grid.insertAdjacentHTML("beforeend", html);
     }
 
 });
@@ -1,20 +1,43 @@
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Header
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
-from sentence_transformers import SentenceTransformer
-import numpy as np
+from typing import List, Optional
 from datetime import datetime
 import uuid
 import os
 from fastapi.middleware.cors import CORSMiddleware
 
 # Import all modules
-from vector_engine import load_or_rebuild, match, add_or_update_vector, remove_vector
+from vector_engine import (
+    load_or_rebuild,
+    match,
+    match_batch,
+    get_stats,
+    force_rebuild_from_db,
+    add_or_update_vector,
+    add_or_update_vectors,
+    remove_vector,
+    shutdown as shutdown_vector_engine,
+)
+import vector_engine
 from github_fetcher import fetch_github_data_for_ai
 from leetcode_fetcher import fetch_leetcode_data_for_ai
-from ai_summarizer import generate_comprehensive_summary, generate_match_explanation,generate_dynamic_match_explanation
-from file_handler import save_uploaded_file, get_file_path, UPLOAD_DIR, delete_student_files
+from ai_summarizer import generate_comprehensive_summary, generate_match_explanation, generate_dynamic_match_explanations
+import attribute_table
+import embedding_service
+import embedding_cache
+from embedding_service import encode_one, encode_many, encode_profile, encode_profiles
+import reconciler
+import section_engine
+import reembed
+import rank_sessions
+import rank_cache
+import explanation_cache
+from file_handler import save_uploaded_file, get_file_path, UPLOAD_DIR, delete_student_files, extract_pdf_text_from_disk
+import executors
+from executors import run_cpu, run_io
+import asyncio
 from resume_summarizer import (
     summarize_resume_with_ai,
     summarize_linkedin_with_ai,
@@ -24,13 +47,20 @@ from resume_summarizer import (
 
 # Database imports - JUST USE THESE, DON'T REDEFINE!
 from db import (
-    save_student,
+    create_student,
     get_student_by_uuid,
     get_students_by_numeric_ids,
     update_student,
     delete_student,
-    get_all_students,
+    iter_student_embeddings,
+    count_students_with_embeddings,
+    get_student_attributes,
     get_next_numeric_id,
+    reserve_numeric_ids,
+    iter_section_embeddings,
+    count_section_embeddings,
+    get_active_embedding_model,
+    ensure_indexes,
     students_collection,
 )
 
@@ -39,8 +69,7 @@ app = FastAPI()
 # Serve uploaded files
 app.mount("/files", StaticFiles(directory=UPLOAD_DIR), name="files")
 
-# Model
-model = SentenceTransformer("all-MiniLM-L6-v2")
+# Model: loaded once by embedding_service, warmed in the background at startup
 
 
 # =====================================================
@@ -49,6 +78,17 @@ model = SentenceTransformer("all-MiniLM-L6-v2")
 
 class JobRequest(BaseModel):
     job_description: str
+    branches: Optional[List[str]] = None
+    years: Optional[List[int]] = None
+    skills: Optional[List[str]] = None
+
+
+class BatchJobRequest(BaseModel):
+    job_descriptions: List[str]
+    include_explanations: bool = False
+    branches: Optional[List[str]] = None
+    years: Optional[List[int]] = None
+    skills: Optional[List[str]] = None
 
 
 
@@ -59,39 +99,77 @@ app.add_middleware(
     allow_headers=["*"],
 )
 # =====================================================
-# HELPER FUNCTIONS (ONLY ONES NOT IN db.py)
+# STARTUP EVENT
 # =====================================================
 
-def extract_pdf_text_from_disk(file_path):
-    """Extract text from PDF stored on disk"""
-    try:
-        import pdfplumber
-        with pdfplumber.open(file_path) as pdf:
-            text = " ".join([page.extract_text() or "" for page in pdf.pages])
-        return text
-    except Exception as e:
-        print(f"PDF extraction error: {e}")
-        return ""
+# Students updated after this are re-read by refresh_attributes()
+_attributes_loaded_at = None
 
 
-# =====================================================
-# STARTUP EVENT
-# =====================================================
+def load_attributes():
+    global _attributes_loaded_at
+    _attributes_loaded_at = datetime.utcnow()
+    attribute_table.load(get_student_attributes())
+
+
+def refresh_attributes():
+    """Read-only workers: fold students the writer changed since the last
+    (re)load into attribute_table once its new checkpoint is picked up"""
+    global _attributes_loaded_at
+    started = datetime.utcnow()
+    attribute_table.upsert_many(list(get_student_attributes(since=_attributes_loaded_at)))
+    _attributes_loaded_at = started
+
+
+def iter_student_records(since=None):
+    """Stream {"id", "embedding"} FAISS records from MongoDB"""
+    for s in iter_student_embeddings(since=since):
+        yield {"id": s["numeric_id"], "embedding": s["embedding"]}
+
 
 @app.on_event("startup")
 def startup_event():
     """Initialize FAISS index from MongoDB on server start"""
+    # Stored vectors may come from a model swapped in by a re-embedding job
+    active_model = get_active_embedding_model()
+    if active_model and active_model != embedding_service.MODEL_NAME:
+        embedding_service.use_model(active_model)
+    embedding_service.warm_up()
+    ensure_indexes()
     print("🚀 Initializing FAISS...")
-    students = get_all_students()  # ✅ Using db.py function
 
-    student_records = [
-        {"id": s["numeric_id"], "embedding": s["embedding"]}
-        for s in students
-        if "embedding" in s and "numeric_id" in s
-    ]
+    # Only students changed since the manifest watermark are read when
+    # students.index is valid; the full stream is used only for a rebuild
+    # A students.index built with another model is rebuilt (writer) or
+    # switches the encoder to its model (read-only workers)
+    vector_engine.on_model_change = embedding_service.use_model
+    vector_engine.on_reload = refresh_attributes
+    load_or_rebuild(
+        iter_student_records,
+        changed_since=lambda watermark: iter_student_records(since=watermark),
+        expected_count=count_students_with_embeddings,
+        model={"name": embedding_service.MODEL_NAME, "tag": embedding_service.model_tag()},
+    )
+    load_attributes()
+    explanation_cache.ensure_indexes()
+    section_engine.load(
+        iter_section_embeddings,
+        changed_since=lambda since: iter_section_embeddings(since=since),
+        expected_counts=lambda: count_section_embeddings(section_engine.SECTIONS),
+    )
+    if not get_stats()["read_only"]:
+        reconciler.start()
+        reembed.resume_interrupted()
+    print(f"✅ FAISS ready with {get_stats()['total_students']} students")
+
 
-    load_or_rebuild(student_records)
-    print(f"✅ FAISS ready with {len(student_records)} students")
+@app.on_event("shutdown")
+def shutdown_event():
+    """Fold any pending FAISS WAL records into students.index"""
+    reconciler.stop()
+    shutdown_vector_engine()
+    section_engine.shutdown()
+    executors.shutdown()
 
 
 # =====================================================
@@ -112,7 +190,7 @@ async def add_student(
     """Complete student registration with AI-powered resume analysis"""
     
     student_uuid = str(uuid.uuid4())
-    student_numeric_id = get_next_numeric_id()  # ✅ Using db.py function
+    student_numeric_id = await run_io(get_next_numeric_id)  # ✅ Using db.py function
     
     print(f"\n{'='*70}")
     print(f"📝 REGISTERING STUDENT: {name}")
@@ -120,32 +198,36 @@ async def add_student(
     
     # STEP 1: SAVE PDFs TO DISK
     print("\n💾 STEP 1: Saving PDFs to disk...")
-    resume_info = save_uploaded_file(resume_pdf, student_uuid, "resume")
-    linkedin_info = save_uploaded_file(linkedin_pdf, student_uuid, "linkedin")
+    resume_info, linkedin_info = await asyncio.gather(
+        run_io(save_uploaded_file, resume_pdf, student_uuid, "resume"),
+        run_io(save_uploaded_file, linkedin_pdf, student_uuid, "linkedin")
+    )
     print(f"   ✅ Resume: {resume_info['filename']}")
     print(f"   ✅ LinkedIn: {linkedin_info['filename']}")
     
-    # STEP 2: PARSE PDFs FROM DISK
+    # STEP 2: PARSE PDFs FROM DISK (process pool, both at once)
     print("\n📖 STEP 2: Extracting text from PDFs...")
-    resume_text = extract_pdf_text_from_disk(resume_info["file_path"])
-    linkedin_text = extract_pdf_text_from_disk(linkedin_info["file_path"])
+    resume_text, linkedin_text = await asyncio.gather(
+        run_cpu(extract_pdf_text_from_disk, resume_info["file_path"]),
+        run_cpu(extract_pdf_text_from_disk, linkedin_info["file_path"])
+    )
     print(f"   ✅ Resume: {len(resume_text)} characters")
     print(f"   ✅ LinkedIn: {len(linkedin_text)} characters")
     
     # STEP 3: AI SUMMARIZE RESUME & LINKEDIN
     print("\n🤖 STEP 3: AI analyzing resume and LinkedIn...")
-    ai_resume_summary = summarize_resume_with_ai(resume_text)
+    ai_resume_summary, ai_linkedin_summary, ai_extracted_skills = await asyncio.gather(
+        run_io(summarize_resume_with_ai, resume_text),
+        run_io(summarize_linkedin_with_ai, linkedin_text),
+        run_io(extract_key_skills_from_resume, resume_text)
+    )
     print(f"   ✅ Resume summary: {ai_resume_summary[:80]}...")
-    
-    ai_linkedin_summary = summarize_linkedin_with_ai(linkedin_text)
     print(f"   ✅ LinkedIn summary: {ai_linkedin_summary[:80]}...")
-    
-    ai_extracted_skills = extract_key_skills_from_resume(resume_text)
     print(f"   ✅ AI found skills: {list(ai_extracted_skills.get('programming_languages', []))[:5]}")
     
     # STEP 4: FETCH GITHUB DATA
     print(f"\n🐙 STEP 4: Fetching GitHub data...")
-    github_data = fetch_github_data_for_ai(github_username)
+    github_data = await run_io(fetch_github_data_for_ai, github_username)
     if not github_data:
         github_data = {
             "username": github_username,
@@ -156,7 +238,7 @@ async def add_student(
             "profile_url": f"https://github.com/{github_username}"
         }
     print(f"   ✅ Found {github_data['statistics']['total_repos']} repos")
-    existing = students_collection.find_one({"github.username": github_username})
+    existing = await run_io(students_collection.find_one, {"github.username": github_username})
     if existing:
       raise HTTPException(
         status_code=400,
@@ -164,7 +246,7 @@ async def add_student(
     )
     # STEP 5: FETCH LEETCODE DATA
     print(f"\n💻 STEP 5: Fetching LeetCode data...")
-    leetcode_data = fetch_leetcode_data_for_ai(leetcode_username)
+    leetcode_data = await run_io(fetch_leetcode_data_for_ai, leetcode_username)
     if not leetcode_data:
         leetcode_data = {
             "username": leetcode_username,
@@ -188,13 +270,14 @@ async def add_student(
         "leetcode": leetcode_data
     }
     
-    external_summaries = generate_comprehensive_summary(student_data_for_ai)
+    external_summaries = await run_io(generate_comprehensive_summary, student_data_for_ai)
     print(f"   ✅ GitHub summary generated")
     print(f"   ✅ LeetCode summary generated")
     
     # STEP 7: CREATE MASTER SUMMARY
     print("\n🌟 STEP 7: Creating comprehensive profile summary...")
-    master_summary = create_comprehensive_profile_summary(
+    master_summary = await run_io(
+        create_comprehensive_profile_summary,
         resume_text=resume_text,
         linkedin_text=linkedin_text,
         github_summary=external_summaries["github_summary"],
@@ -216,11 +299,23 @@ async def add_student(
         f"LeetCode: {external_summaries['leetcode_summary']}"
     )
     
-    embedding = model.encode(profile_text)
-    embedding = embedding / np.linalg.norm(embedding)
+    embedding = await run_io(encode_profile, profile_text)
     embedding_list = embedding.tolist()
     print(f"   ✅ Embedding created: {len(embedding_list)}-D vector")
     
+    section_vectors = (await run_io(section_engine.encode_sections, [section_engine.section_texts({
+        "resume_text": resume_text,
+        "linkedin_text": linkedin_text,
+        "ai_resume_summary": ai_resume_summary,
+        "ai_linkedin_summary": ai_linkedin_summary,
+        "ai_extracted_skills": ai_extracted_skills,
+        "github": github_data,
+        "github_summary": external_summaries["github_summary"],
+        "leetcode_summary": external_summaries["leetcode_summary"],
+        "skills": manual_skills
+    })]))[0]
+    print(f"   ✅ Section vectors: {', '.join(section_vectors)}")
+    
     # STEP 9: SAVE TO MONGODB
     print("\n💾 STEP 9: Saving to MongoDB...")
     student_document = {
@@ -243,21 +338,26 @@ async def add_student(
         "github_summary": external_summaries["github_summary"],
         "leetcode_summary": external_summaries["leetcode_summary"],
         "embedding": embedding_list,
+        "embedding_model": embedding_service.model_tag(),
+        "profile_text": profile_text,
+        "section_embeddings": {name: v.tolist() for name, v in section_vectors.items()},
         "created_at": datetime.utcnow(),
         "updated_at": datetime.utcnow()
     }
     
-    save_student(student_document)  # ✅ Using db.py function
+    await run_io(create_student, student_document)  # ✅ Using db.py function
     print("   ✅ Saved to MongoDB")
     
     # STEP 10: ADD TO FAISS
     print("\n🔍 STEP 10: Adding to FAISS index...")
-    if not add_or_update_vector(student_numeric_id, embedding_list):
+    if not await run_io(add_or_update_vector, student_numeric_id, embedding_list):
         print("   ❌ FAISS failed, rolling back...")
-        delete_student(student_uuid)  # ✅ Using db.py function
-        delete_student_files([resume_info["file_path"], linkedin_info["file_path"]])
+        await run_io(delete_student, student_uuid)  # ✅ Using db.py function
+        await run_io(delete_student_files, [resume_info["file_path"], linkedin_info["file_path"]])
         raise HTTPException(status_code=500, detail="FAISS indexing failed")
     
+    attribute_table.upsert(student_document)
+    await run_io(section_engine.upsert, student_numeric_id, section_vectors)
     print("   ✅ Added to FAISS")
     
     print(f"\n{'='*70}")
@@ -303,17 +403,9 @@ def get_student_endpoint(student_id: str):
 # RANK STUDENTS (JOB MATCHING)
 # =====================================================
 
-@app.post("/rank")
-def rank_students(request: JobRequest, top_k: int = 100):
-    """Rank students for a job description"""
-    
-    print(f"\n{'='*60}")
-    print(f"🎯 Ranking students for job")
-    print(f"{'='*60}")
-    print(f"JD: {request.job_description[:100]}...")
-    
-    jd_embedding = model.encode(request.job_description)
-    jd_lower = request.job_description.lower()
+def detect_role(job_description):
+    """'dsa', 'backend', 'ml' or 'general' for the role the JD describes"""
+    jd_lower = job_description.lower()
 
     is_dsa_role = any(word in jd_lower for word in [
        "dsa", "data structures", "algorithms",
@@ -329,62 +421,116 @@ def rank_students(request: JobRequest, top_k: int = 100):
       "computer vision", "model training"
     ])
 
-    jd_embedding = jd_embedding / np.linalg.norm(jd_embedding)
-    
-    print("🔍 Searching FAISS index...")
-    faiss_results = match(jd_embedding.tolist(), top_k=top_k)
-    
-    if not faiss_results:
-        return {"message": "No students found", "ranked_students": []}
-    
-    print(f"   ✅ Found {len(faiss_results)} candidates")
-    
-    numeric_ids = [r["student_id"] for r in faiss_results]
-    students = get_students_by_numeric_ids(numeric_ids)  # ✅ Using db.py function
-    faiss_scores = {r["student_id"]: r["score"] for r in faiss_results}
-    
-    print("📊 Calculating scores...")
-    ranked = []
-    semantic_weight = 0.4
-    github_weight = 0.3
-    leetcode_weight = 0.3
-
     if is_dsa_role:
-      semantic_weight = 0.3
-      github_weight = 0.2
-      leetcode_weight = 0.5
-
-    elif is_backend_role:
-      semantic_weight = 0.4
-      github_weight = 0.4
-      leetcode_weight = 0.2
-
-    elif is_ml_role:
-       semantic_weight = 0.6
-       github_weight = 0.3
-       leetcode_weight = 0.1
-
-    for student in students:
-        semantic_sim = faiss_scores.get(student["numeric_id"], 0.0)
-        github_score = student["github"].get("github_score", 0) / 100
-        leetcode_score = student["leetcode"].get("coding_score", 0) / 100
-        
-        final_score = (
-          semantic_sim * semantic_weight +
-          github_score * github_weight +
-         leetcode_score * leetcode_weight
-        )
+        return "dsa"
+    if is_backend_role:
+        return "backend"
+    if is_ml_role:
+        return "ml"
+    return "general"
+
+
+ROLE_WEIGHTS = {
+    # (semantic, github, leetcode)
+    "dsa": (0.3, 0.2, 0.5),
+    "backend": (0.4, 0.4, 0.2),
+    "ml": (0.6, 0.3, 0.1),
+    "general": (0.4, 0.3, 0.3),
+}
+
+# How much each profile section counts towards the semantic similarity
+SECTION_WEIGHTS = {
+    "dsa": {"leetcode": 0.4, "skills": 0.2, "resume": 0.2, "github": 0.1, "linkedin": 0.1},
+    "backend": {"github": 0.3, "resume": 0.3, "skills": 0.2, "linkedin": 0.1, "leetcode": 0.1},
+    "ml": {"resume": 0.35, "github": 0.25, "skills": 0.2, "linkedin": 0.15, "leetcode": 0.05},
+    "general": {"resume": 0.3, "skills": 0.2, "github": 0.2, "linkedin": 0.15, "leetcode": 0.15},
+}
+
+
+def get_role_weights(job_description):
+    """Pick (semantic, github, leetcode) weights from the role the JD describes"""
+    return ROLE_WEIGHTS[detect_role(job_description)]
+
+
+def get_section_weights(job_description):
+    """Per-section late-fusion weights for the role the JD describes"""
+    return SECTION_WEIGHTS[detect_role(job_description)]
+
+
+def fuse_sections(job_description, jd_embedding, faiss_results, top_k, filter_ids=None):
+    """Widen FAISS hits with per-section hits and fuse section similarities.
+
+    Returns (candidates, section_scores): candidates found only through a
+    section index are added with their fused score.
+    """
+    if not section_engine.FUSION_ENABLED:
+        return faiss_results, None
+    section_scores = section_engine.score(
+        jd_embedding,
+        [r["student_id"] for r in faiss_results],
+        get_section_weights(job_description),
+        top_k=top_k,
+        filter_ids=filter_ids
+    )
+    found = {r["student_id"] for r in faiss_results}
+    extra = [
+        {"student_id": numeric_id, "score": fused["score"]}
+        for numeric_id, fused in section_scores.items()
+        if numeric_id not in found
+    ]
+    return faiss_results + extra, section_scores
+
+
+def get_filter_ids(request):
+    """numeric_ids allowed by the request's branch/year/skill filters, or None"""
+    if not attribute_table.has_filters(request.branches, request.years, request.skills):
+        return None
+    return attribute_table.matching_ids(
+        branches=request.branches,
+        years=request.years,
+        skills=request.skills
+    )
+
+
+def hybrid_rank(job_description, faiss_results, section_scores=None, top_k=None):
+    """Hybrid-score FAISS hits over the attribute_table columns, best first.
+
+    With `section_scores` (see fuse_sections) the fused section similarity
+    replaces the single-vector one. MongoDB is only read for hits that are
+    not in attribute_table yet.
+    """
+    semantic = {
+        r["student_id"]: section_scores[r["student_id"]]["score"]
+        if section_scores and r["student_id"] in section_scores else r["score"]
+        for r in faiss_results
+    }
+    # e.g. registered through another worker since this one loaded the table
+    unknown = attribute_table.unknown_ids(list(semantic.keys()))
+    if len(unknown):
+        attribute_table.upsert_many(get_students_by_numeric_ids(unknown.tolist(), profile="ranking"))
+    return attribute_table.hybrid_scores(
+        list(semantic.keys()),
+        list(semantic.values()),
+        get_role_weights(job_description),
+        top_k=top_k
+    )
+
+
+def build_ranked(job_description, scored, students_by_id, section_scores=None, explain=True):
+    """Response rows for hybrid_rank() output, in its order"""
+    ranked = []
+    for numeric_id, semantic_sim, github_score, leetcode_score, final_score in zip(
+        scored["numeric_id"].tolist(),
+        scored["semantic"].tolist(),
+        scored["github_score"].tolist(),
+        scored["leetcode_score"].tolist(),
+        scored["final_score"].tolist()
+    ):
+        student = students_by_id.get(numeric_id)
+        if student is None:
+            continue  # deleted since it was scored
+        section_sims = section_scores[numeric_id]["sections"] if section_scores and numeric_id in section_scores else {}
 
-        
-        match_exp = generate_dynamic_match_explanation(
-          job_description=request.job_description,
-         student=student,
-          semantic_similarity=semantic_sim,
-           github_score=github_score,
-           leetcode_score=leetcode_score,
-          final_score=final_score
-        )
-        
         ranked.append({
             "student_id": student["student_id"],
             "numeric_id": student["numeric_id"],
@@ -394,12 +540,13 @@ def rank_students(request: JobRequest, top_k: int = 100):
             "skills": student["skills"],
             "final_score": round(final_score, 3),
             "semantic_similarity": round(semantic_sim, 3),
+            "section_similarities": {name: round(sim, 3) for name, sim in section_sims.items()},
             "github_score": round(github_score, 3),
             "leetcode_score": round(leetcode_score, 3),
             "overall_summary": student.get("master_summary", ""),
             "github_summary": student.get("github_summary", ""),
             "leetcode_summary": student.get("leetcode_summary", ""),
-            "match_explanation": match_exp,
+            "match_explanation": None,
             "github_profile": student.get("github", {}).get("profile_url", ""),
             "leetcode_profile": student.get("leetcode", {}).get("profile_url", ""),
             "resume_url": student.get("resume", {}).get("file_url", ""),
@@ -418,10 +565,140 @@ def rank_students(request: JobRequest, top_k: int = 100):
             }
         })
     
-    ranked.sort(key=lambda x: x["final_score"], reverse=True)
+    # Explanations run concurrently; failed/late ones leave the ranking intact
+    if explain and ranked:
+        explanations = generate_dynamic_match_explanations(
+            job_description, explanation_inputs(ranked, students_by_id)
+        )
+        for item, explanation in zip(ranked, explanations):
+            item["match_explanation"] = explanation
+    return ranked
+
+
+def score_candidates(job_description, faiss_results, explain=True, section_scores=None, top_k=None):
+    """Hybrid-rank FAISS hits and load only the students that make the cut.
+
+    Returns (ranked, students_by_id).
+    """
+    scored = hybrid_rank(job_description, faiss_results, section_scores=section_scores, top_k=top_k)
+    numeric_ids = scored["numeric_id"].tolist()
+    students = get_students_by_numeric_ids(numeric_ids, profile="card")  # ✅ Using db.py function
+    students_by_id = {s["numeric_id"]: s for s in students}
+    ranked = build_ranked(job_description, scored, students_by_id, section_scores=section_scores, explain=explain)
+    return ranked, students_by_id
+
+
+def explanation_inputs(ranked, students_by_id):
+    """generate_dynamic_match_explanation arguments for each ranked candidate"""
+    return [
+        {
+            "student": students_by_id[item["numeric_id"]],
+            "semantic_similarity": item["semantic_similarity"],
+            "github_score": item["github_score"],
+            "leetcode_score": item["leetcode_score"],
+            "final_score": item["final_score"]
+        }
+        for item in ranked
+    ]
+
+
+@app.post("/rank")
+def rank_students(
+    request: JobRequest,
+    top_k: int = 100,
+    nprobe: int = None,
+    ef_search: int = None,
+    stream_explanations: bool = False,
+    page_size: int = None
+):
+    """Rank students for a job description.
+
+    With stream_explanations the ranking returns immediately (explanations
+    null) with a session_id; explanations are pushed by
+    GET /rank/{session_id}/explanations as they complete.
+
+    With page_size all top_k candidates are scored and kept server-side
+    (ranking_id); only the first page is loaded and explained, the rest
+    via GET /rank/{ranking_id}/page?cursor=...
+
+    Identical concurrent requests (same whitespace-normalized JD and
+    parameters) share one computation, and the result is reused for
+    RANK_CACHE_TTL seconds until the index changes (see rank_cache).
+    """
+    if page_size is not None and page_size < 1:
+        raise HTTPException(status_code=400, detail="page_size must be at least 1")
+    
+    key = rank_cache.cache_key(
+        request.job_description,
+        branches=request.branches,
+        years=request.years,
+        skills=request.skills,
+        top_k=top_k,
+        nprobe=nprobe,
+        ef_search=ef_search,
+        stream_explanations=stream_explanations,
+        page_size=page_size
+    )
+    return rank_cache.get_or_compute(
+        key,
+        lambda: compute_ranking(request, top_k, nprobe, ef_search, stream_explanations, page_size)
+    )
+
+
+def compute_ranking(request, top_k, nprobe, ef_search, stream_explanations, page_size):
+    """The /rank computation itself (see rank_students)"""
+    print(f"\n{'='*60}")
+    print(f"🎯 Ranking students for job")
+    print(f"{'='*60}")
+    print(f"JD: {request.job_description[:100]}...")
+    
+    jd_embedding = encode_one(request.job_description)
+    
+    filter_ids = get_filter_ids(request)
+    
+    print("🔍 Searching FAISS index...")
+    faiss_results = match(jd_embedding.tolist(), top_k=top_k, nprobe=nprobe, ef_search=ef_search, filter_ids=filter_ids)
+    
+    faiss_results, section_scores = fuse_sections(
+        request.job_description, jd_embedding, faiss_results, top_k, filter_ids=filter_ids
+    )
+    
+    if not faiss_results:
+        return {"message": "No students found", "ranked_students": []}
+    
+    print(f"   ✅ Found {len(faiss_results)} candidates")
+    
+    if page_size:
+        print("📊 Calculating scores...")
+        ranking = rank_sessions.create_ranking(
+            request.job_description,
+            hybrid_rank(request.job_description, faiss_results, section_scores=section_scores, top_k=top_k),
+            section_scores
+        )
+        print(f"✅ Ranking {ranking.ranking_id} holds {len(ranking)} students\n")
+        return rank_page(ranking, 0, page_size, stream_explanations=stream_explanations)
+    
+    print("📊 Calculating scores...")
+    ranked, students = score_candidates(
+        request.job_description, faiss_results,
+        section_scores=section_scores, top_k=top_k,
+        explain=not stream_explanations
+    )
     
     print(f"✅ Returning {len(ranked)} ranked students\n")
     
+    if stream_explanations:
+        session = rank_sessions.create(
+            request.job_description, ranked, explanation_inputs(ranked, students)
+        )
+        return {
+            "job_description": request.job_description,
+            "session_id": session.session_id,
+            "explanations_url": f"/rank/{session.session_id}/explanations",
+            "total_candidates": len(ranked),
+            "ranked_students": ranked
+        }
+    
     return {
         "job_description": request.job_description,
         "total_candidates": len(ranked),
@@ -429,6 +706,107 @@ def rank_students(request: JobRequest, top_k: int = 100):
     }
 
 
+def rank_page(ranking, cursor, page_size, stream_explanations=False):
+    """Load, build and explain one page of a stored ranking"""
+    scored, next_cursor = ranking.page(cursor, page_size)
+    students = get_students_by_numeric_ids(scored["numeric_id"].tolist(), profile="card")
+    students_by_id = {s["numeric_id"]: s for s in students}
+    ranked = build_ranked(
+        ranking.job_description, scored, students_by_id,
+        section_scores=ranking.section_scores, explain=not stream_explanations
+    )
+    
+    response = {
+        "job_description": ranking.job_description,
+        "ranking_id": ranking.ranking_id,
+        "total_candidates": len(ranking),
+        "cursor": cursor,
+        "next_cursor": next_cursor,
+        "next_url": (
+            f"/rank/{ranking.ranking_id}/page?cursor={next_cursor}&page_size={page_size}"
+            if next_cursor is not None else None
+        ),
+        "ranked_students": ranked
+    }
+    if stream_explanations and ranked:
+        session = rank_sessions.create(
+            ranking.job_description, ranked, explanation_inputs(ranked, students_by_id)
+        )
+        response["session_id"] = session.session_id
+        response["explanations_url"] = f"/rank/{session.session_id}/explanations"
+    return response
+
+
+@app.get("/rank/{ranking_id}/page")
+def get_rank_page(ranking_id: str, cursor: int = 0, page_size: int = 20, stream_explanations: bool = False):
+    """Next page of a paginated /rank result"""
+    ranking = rank_sessions.get_ranking(ranking_id)
+    if ranking is None:
+        raise HTTPException(status_code=404, detail="Ranking not found or expired")
+    if cursor < 0 or page_size < 1:
+        raise HTTPException(status_code=400, detail="cursor must be >= 0 and page_size >= 1")
+    return rank_page(ranking, cursor, page_size, stream_explanations=stream_explanations)
+
+
+@app.get("/rank/{session_id}/explanations")
+async def stream_rank_explanations(session_id: str, last_event_id: Optional[str] = Header(None)):
+    """Server-Sent Events stream of a ranking session's match explanations"""
+    session = rank_sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Ranking session not found or expired")
+    return StreamingResponse(
+        rank_sessions.stream(session, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.post("/rank/batch")
+def rank_students_batch(request: BatchJobRequest, top_k: int = 100, nprobe: int = None, ef_search: int = None):
+    """Rank the same pool against many job descriptions in one pass"""
+    
+    job_descriptions = request.job_descriptions
+    if not job_descriptions:
+        raise HTTPException(status_code=400, detail="job_descriptions must not be empty")
+    
+    print(f"\n🎯 Batch ranking students for {len(job_descriptions)} jobs")
+    
+    # One batched encode and one multi-row FAISS search for every JD
+    jd_embeddings = encode_many(job_descriptions)
+    filter_ids = get_filter_ids(request)
+    faiss_results = match_batch(jd_embeddings, top_k=top_k, nprobe=nprobe, ef_search=ef_search, filter_ids=filter_ids)
+    fused = [
+        fuse_sections(job_description, jd_embedding, results, top_k, filter_ids=filter_ids)
+        for job_description, jd_embedding, results in zip(job_descriptions, jd_embeddings, faiss_results)
+    ]
+    faiss_results = [results for results, _ in fused]
+    
+    scored = [
+        hybrid_rank(job_description, results, section_scores=section_scores, top_k=top_k)
+        for job_description, results, (_, section_scores) in zip(job_descriptions, faiss_results, fused)
+    ]
+    
+    # One Mongo round trip for the union of every job's final page
+    numeric_ids = sorted({i for s in scored for i in s["numeric_id"].tolist()})
+    students = get_students_by_numeric_ids(numeric_ids, profile="card")
+    students_by_id = {s["numeric_id"]: s for s in students}
+    print(f"   ✅ {len(numeric_ids)} distinct candidates across all jobs")
+    
+    rankings = []
+    for job_description, job_scored, (_, section_scores) in zip(job_descriptions, scored, fused):
+        ranked = build_ranked(
+            job_description, job_scored, students_by_id,
+            section_scores=section_scores, explain=request.include_explanations
+        )
+        rankings.append({
+            "job_description": job_description,
+            "total_candidates": len(ranked),
+            "ranked_students": ranked
+        })
+    
+    return {"total_jobs": len(rankings), "rankings": rankings}
+
+
 # =====================================================
 # UPDATE STUDENT
 # =====================================================
@@ -436,7 +814,7 @@ def rank_students(request: JobRequest, top_k: int = 100):
 @app.put("/student/{student_id}")
 async def update_student_endpoint(student_id: str, skills: str = Form(None)):
     """Update student skills and regenerate embedding"""
-    student = get_student_by_uuid(student_id)  # ✅ Using db.py function
+    student = await run_io(get_student_by_uuid, student_id)  # ✅ Using db.py function
     
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
@@ -451,18 +829,29 @@ async def update_student_endpoint(student_id: str, skills: str = Form(None)):
         f"Skills: {' '.join(manual_skills)}"
     )
     
-    embedding = model.encode(profile_text)
-    embedding = embedding / np.linalg.norm(embedding)
+    embedding = await run_io(encode_profile, profile_text)
+    
+    # Only the skills section changed; other section vectors are kept
+    skills_text = section_engine.section_texts({**student, "skills": manual_skills}).get("skills", "")
+    section_vectors = (await run_io(section_engine.encode_sections, [{"skills": skills_text} if skills_text else {}]))[0]
     
     # Update using db.py function
     update_data = {
         "skills": manual_skills,
         "embedding": embedding.tolist(),
+        "embedding_model": embedding_service.model_tag(),
+        "profile_text": profile_text,
+        **section_engine.to_document(section_vectors),
         "updated_at": datetime.utcnow()
     }
     
-    update_student(student_id, update_data)  # ✅ Using db.py function
-    add_or_update_vector(student["numeric_id"], embedding.tolist())
+    await run_io(update_student, student_id, update_data)  # ✅ Using db.py function
+    if not await run_io(add_or_update_vector, student["numeric_id"], embedding.tolist()):
+        # Mongo already has the new embedding; let the reconciler repair FAISS
+        print(f"   ⚠️ FAISS update failed for {student_id}, scheduling reconcile")
+        reconciler.request_run()
+    attribute_table.upsert({**student, "skills": manual_skills})
+    await run_io(section_engine.upsert, student["numeric_id"], section_vectors)
     
     return {"success": True, "message": "Student updated"}
 
@@ -485,7 +874,8 @@ async def bulk_upload(file: UploadFile = File(...)):
     else:
         return {"error": "Only .xlsx or .json files are supported"}
 
-    inserted_count = 0
+    student_documents = []
+    profile_texts = []
 
     for student in data:
 
@@ -498,42 +888,33 @@ async def bulk_upload(file: UploadFile = File(...)):
 
         manual_skills = [s.strip() for s in skills.split(",")] if skills else []
 
-        # GitHub Fetch
-        github_api_url = f"https://api.github.com/users/{github_username}/repos"
-        response = requests.get(github_api_url)
-
-        if response.status_code != 200:
-            github_data = {"repos": 0, "stars": 0, "primary_languages": []}
-        else:
-            repos_data = response.json()
-            total_repos = len(repos_data)
-            total_stars = 0
-            languages = set()
-
-            for repo in repos_data:
-                total_stars += repo.get("stargazers_count", 0)
-                if repo.get("language"):
-                    languages.add(repo["language"])
-
+        # GitHub + LeetCode Fetch (same helpers and fallbacks as /add-student)
+        github_data, leetcode_data = await asyncio.gather(
+            run_io(fetch_github_data_for_ai, github_username) if github_username else asyncio.sleep(0),
+            run_io(fetch_leetcode_data_for_ai, leetcode_username) if leetcode_username else asyncio.sleep(0)
+        )
+        if not github_data:
             github_data = {
-                "repos": total_repos,
-                "stars": total_stars,
-                "primary_languages": list(languages)
+                "username": github_username,
+                "statistics": {"total_repos": 0, "total_stars": 0, "total_forks": 0},
+                "languages": {},
+                "notable_projects": [],
+                "github_score": 0,
+                "profile_url": f"https://github.com/{github_username}"
+            }
+        if not leetcode_data:
+            leetcode_data = {
+                "username": leetcode_username,
+                "problems_solved": {"total": 0, "easy": 0, "medium": 0, "hard": 0},
+                "top_topics": [],
+                "coding_score": 0,
+                "profile_url": f"https://leetcode.com/{leetcode_username}"
             }
 
-        # LeetCode Fetch
-        leetcode_stats = fetch_leetcode_stats(leetcode_username)
-
-        if leetcode_stats:
-            leetcode_data = leetcode_stats
-        else:
-            leetcode_data = {"easy": 0, "medium": 0, "hard": 0, "rating": 0}
-
-        # Embedding
-        profile_text = " ".join(manual_skills) + " " + " ".join(github_data["primary_languages"])
-        embedding = model.encode([profile_text])[0].tolist()
+        profile_texts.append(" ".join(manual_skills) + " " + " ".join(github_data["languages"]))
 
         student_document = {
+            "student_id": str(uuid.uuid4()),
             "name": name,
             "branch": branch,
             "year": year,
@@ -541,14 +922,43 @@ async def bulk_upload(file: UploadFile = File(...)):
             "github": github_data,
             "leetcode": leetcode_data,
             "professional": {"internships": 0, "certifications": 0},
-            "embedding": embedding,
             "source": "bulk"
         }
+        student_documents.append(student_document)
 
-        students_collection.insert_one(student_document)
-        inserted_count += 1
+    if not student_documents:
+        return {"message": "0 students uploaded successfully"}
+
+    # Embed, insert and index the whole file in one pass each, off the event loop
+    numeric_ids = await run_io(reserve_numeric_ids, len(student_documents))
+    embeddings = await run_io(encode_profiles, profile_texts)
+    section_vectors = await run_io(
+        section_engine.encode_sections,
+        [section_engine.section_texts(d) for d in student_documents]
+    )
+    now = datetime.utcnow()
+
+    for student_document, numeric_id, embedding, sections, profile_text in zip(
+        student_documents, numeric_ids, embeddings, section_vectors, profile_texts
+    ):
+        student_document["profile_text"] = profile_text
+        student_document["numeric_id"] = numeric_id
+        student_document["embedding"] = embedding.tolist()
+        student_document["embedding_model"] = embedding_service.model_tag()
+        student_document["section_embeddings"] = {name: v.tolist() for name, v in sections.items()}
+        student_document["created_at"] = now
+        student_document["updated_at"] = now
+
+    await run_io(students_collection.insert_many, student_documents)
+
+    if not await run_io(add_or_update_vectors, numeric_ids, embeddings):
+        await run_io(students_collection.delete_many, {"numeric_id": {"$in": numeric_ids}})
+        raise HTTPException(status_code=500, detail="FAISS indexing failed")
 
-    return {"message": f"{inserted_count} students uploaded successfully"}
+    attribute_table.upsert_many(student_documents)
+    await run_io(section_engine.upsert_many, numeric_ids, section_vectors)
+
+    return {"message": f"{len(student_documents)} students uploaded successfully"}
 @app.post("/upload-documents/{student_name}")
 async def upload_documents(
     student_name: str,
@@ -597,7 +1007,18 @@ async def upload_documents(
 
     # Regenerate embedding
     profile_text = " ".join(updated_skills) + " " + " ".join(student["github"]["primary_languages"])
-    new_embedding = model.encode([profile_text])[0].tolist()
+    new_embedding = encode_profile(profile_text).tolist()
+
+    # Re-embed only the sections the new documents change
+    texts = section_engine.section_texts({
+        **student,
+        "skills": updated_skills,
+        "resume_text": resume_text,
+        "linkedin_text": linkedin_text
+    })
+    section_vectors = section_engine.encode_sections([
+        {name: texts[name] for name in ("resume", "linkedin", "skills") if name in texts}
+    ])[0]
 
     students_collection.update_one(
         {"name": student_name},
@@ -605,10 +1026,19 @@ async def upload_documents(
             "$set": {
                 "skills": updated_skills,
                 "embedding": new_embedding,
-                "has_documents": True
+                "embedding_model": embedding_service.model_tag(),
+                "profile_text": profile_text,
+                **section_engine.to_document(section_vectors),
+                "has_documents": True,
+                "updated_at": datetime.utcnow()
             }
         }
     )
+    if "numeric_id" in student:
+        if not add_or_update_vector(student["numeric_id"], new_embedding):
+            reconciler.request_run()
+        attribute_table.upsert({**student, "skills": updated_skills})
+        section_engine.upsert(student["numeric_id"], section_vectors)
 
     return {"message": "Documents uploaded and profile enriched successfully"}
 
@@ -626,6 +1056,8 @@ def delete_student_endpoint(student_id: str):
     
     # Remove from FAISS
     remove_vector(student["numeric_id"])
+    attribute_table.remove(student["numeric_id"])
+    section_engine.remove(student["numeric_id"])
     
     # Delete files
     file_paths = [
@@ -669,15 +1101,14 @@ def health_check():
     return {
         "status": "running",
         "service": "AI Campus Placement System",
-        "version": "3.0"
+        "version": "3.0",
+        "embedding_model_ready": embedding_service.is_ready()
     }
 
 
 @app.get("/stats")
 def system_stats():
     """System statistics"""
-    from vector_engine import get_stats
-    
     return {
         "mongodb": {
             "total_students": students_collection.count_documents({}),
@@ -685,11 +1116,56 @@ def system_stats():
             "collection": "students"
         },
         "faiss": get_stats(),
+        "embedding": embedding_service.get_batch_stats(),
+        "embedding_cache": embedding_cache.get_stats(),
+        "sections": section_engine.get_stats(),
+        "explanation_cache": explanation_cache.get_stats(),
+        "rank_cache": rank_cache.get_stats(),
         "storage": {
             "upload_dir": UPLOAD_DIR,
             "total_files": len([f for f in os.listdir(UPLOAD_DIR) if f.endswith('.pdf')]) if os.path.exists(UPLOAD_DIR) else 0
         }
     }
+@app.post("/admin/rebuild-index")
+def rebuild_index_endpoint():
+    """Rebuild FAISS from MongoDB in the background; progress is in /stats"""
+    started = force_rebuild_from_db(iter_student_records)
+    if not started:
+        raise HTTPException(status_code=409, detail="A rebuild is already running")
+    return {"success": True, "message": "Rebuild started", "faiss": get_stats()}
+
+
+class ReembedRequest(BaseModel):
+    model: str
+
+
+@app.post("/admin/reembed")
+def reembed_endpoint(request: ReembedRequest):
+    """Re-embed every student with another model in the background and
+    swap it in once complete; progress is in GET /admin/reembed"""
+    try:
+        return {"success": True, **reembed.start(request.model)}
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@app.get("/admin/reembed")
+def reembed_status():
+    return reembed.status()
+
+
+@app.post("/admin/reconcile")
+def reconcile_endpoint():
+    """Repair drift between MongoDB and FAISS now and return the report"""
+    return reconciler.reconcile()
+
+
+@app.get("/admin/reconcile")
+def last_reconcile_report():
+    """Report from the most recent reconcile run"""
+    return reconciler.last_report or {"status": "never run"}
+
+
 @app.get("/students")
 def list_students(skip: int = 0, limit: int = 100):
     """
@@ -0,0 +1,106 @@
+import os
+import numpy as np
+
+# ===============================
+# CONFIG
+# ===============================
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "onnx_model")
+ONNX_QUANTIZE = os.getenv("ONNX_QUANTIZE", "0") == "1"  # dynamic int8 weights
+ONNX_INTRA_OP_THREADS = int(os.getenv("ONNX_INTRA_OP_THREADS", "0"))  # 0 = onnxruntime default
+MAX_SEQ_LENGTH = 256  # same truncation as SentenceTransformer for MiniLM
+
+
+def _model_paths(model_name):
+    base = os.path.join(ONNX_MODEL_DIR, model_name.replace("/", "__"))
+    return base, os.path.join(base, "model.onnx"), os.path.join(base, "model.int8.onnx")
+
+
+def export(model_name, quantize=ONNX_QUANTIZE):
+    """Export the transformer to ONNX (once) and return the model file to load.
+
+    Only needs torch/transformers the first time; afterwards the exported
+    files in ONNX_MODEL_DIR are reused.
+    """
+    base, fp32_path, int8_path = _model_paths(model_name)
+    target = int8_path if quantize else fp32_path
+    if os.path.exists(target):
+        return target
+
+    from transformers import AutoTokenizer, AutoModel
+    import torch
+
+    hf_name = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+    os.makedirs(base, exist_ok=True)
+
+    if not os.path.exists(fp32_path):
+        print(f"Exporting {hf_name} to ONNX...")
+        tokenizer = AutoTokenizer.from_pretrained(hf_name)
+        model = AutoModel.from_pretrained(hf_name).eval()
+        sample = tokenizer(["warm up"], return_tensors="pt")
+        input_names = ["input_ids", "attention_mask", "token_type_ids"]
+        dynamic = {name: {0: "batch", 1: "sequence"} for name in input_names}
+        dynamic["last_hidden_state"] = {0: "batch", 1: "sequence"}
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                tuple(sample[name] for name in input_names),
+                fp32_path,
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic,
+                opset_version=14
+            )
+        tokenizer.save_pretrained(base)
+
+    if quantize and not os.path.exists(int8_path):
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        print("Quantizing ONNX model to int8...")
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+
+    return target
+
+
+class OnnxEncoder:
+    """Drop-in for SentenceTransformer.encode() on top of ONNX Runtime:
+    tokenize -> transformer -> mean pooling -> optional L2 normalization"""
+
+    def __init__(self, model_name, quantize=ONNX_QUANTIZE, intra_op_threads=ONNX_INTRA_OP_THREADS):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        path = export(model_name, quantize=quantize)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(_model_paths(model_name)[0])
+        self.quantized = quantize
+        print(f"ONNX Runtime model loaded ({os.path.basename(path)}).")
+
+    def _encode_batch(self, texts):
+        tokens = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=MAX_SEQ_LENGTH,
+            return_tensors="np"
+        )
+        feeds = {k: v.astype("int64") for k, v in tokens.items() if k in self.input_names}
+        hidden = self.session.run(["last_hidden_state"], feeds)[0]
+
+        mask = tokens["attention_mask"][..., None].astype("float32")
+        return (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+    def encode(self, texts, batch_size=32, normalize_embeddings=False, **kwargs):
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        vectors = np.vstack([
+            self._encode_batch(texts[i:i + batch_size])
+            for i in range(0, len(texts), batch_size)
+        ]) if texts else np.empty((0, 0), dtype="float32")
+        vectors = vectors.astype("float32")
+        if normalize_embeddings and len(vectors):
+            vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        return vectors[0] if single else vectors
@@ -0,0 +1,119 @@
+import os
+import json
+import time
+import hashlib
+from threading import Lock
+from concurrent.futures import Future
+
+from vector_engine import get_index_version
+
+# ===============================
+# CONFIG
+# ===============================
+# How long an identical /rank request reuses a finished result ("0" = only
+# coalesce requests that are in flight at the same time)
+RANK_CACHE_TTL = float(os.getenv("RANK_CACHE_TTL", "30"))  # seconds
+RANK_CACHE_MAX_ENTRIES = int(os.getenv("RANK_CACHE_MAX_ENTRIES", "256"))
+
+# ===============================
+# STATE
+# ===============================
+_results = {}     # key -> (index_version, expires_at, result)
+_in_flight = {}   # key -> Future shared by every caller waiting on it
+_lock = Lock()
+
+rank_cache_stats = {
+    "hits": 0,
+    "misses": 0,
+    "coalesced": 0,
+    "invalidated": 0,
+}
+
+
+def normalize_job_description(job_description):
+    """Collapse whitespace so re-pasted copies of a JD compare equal"""
+    return " ".join(job_description.split())
+
+
+def cache_key(job_description, **params):
+    """Same key for requests that must get the same ranking: the normalized
+    JD plus every query parameter (list filters in sorted order)"""
+    params = {name: sorted(value) if isinstance(value, list) else value for name, value in params.items()}
+    raw = json.dumps(
+        {"job_description": normalize_job_description(job_description), **params},
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _evict_unsafe():
+    now = time.monotonic()
+    for key in [key for key, (_, expires_at, _) in _results.items() if expires_at <= now]:
+        del _results[key]
+    while len(_results) >= RANK_CACHE_MAX_ENTRIES:
+        del _results[min(_results, key=lambda key: _results[key][1])]
+
+
+def get_or_compute(key, compute):
+    """Single-flight: run compute() once per key.
+
+    Callers arriving while it runs wait for and share its result; later
+    callers reuse it for RANK_CACHE_TTL seconds unless a new index version
+    was published meanwhile. Exceptions are shared but never cached.
+    """
+    version = get_index_version()
+    with _lock:
+        cached = _results.get(key)
+        if cached is not None:
+            if cached[0] == version and cached[1] > time.monotonic():
+                rank_cache_stats["hits"] += 1
+                return cached[2]
+            del _results[key]
+            if cached[0] != version:
+                rank_cache_stats["invalidated"] += 1
+
+        future = _in_flight.get(key)
+        owner = future is None
+        if owner:
+            future = Future()
+            _in_flight[key] = future
+            rank_cache_stats["misses"] += 1
+        else:
+            rank_cache_stats["coalesced"] += 1
+
+    if not owner:
+        return future.result()
+
+    try:
+        result = compute()
+    except Exception as e:
+        with _lock:
+            _in_flight.pop(key, None)
+        future.set_exception(e)
+        raise
+
+    with _lock:
+        _in_flight.pop(key, None)
+        if RANK_CACHE_TTL > 0:
+            _evict_unsafe()
+            # Tagged with the version seen before computing: if the index
+            # changed meanwhile the entry is already stale
+            _results[key] = (version, time.monotonic() + RANK_CACHE_TTL, result)
+    future.set_result(result)
+    return result
+
+
+def clear():
+    with _lock:
+        _results.clear()
+
+
+def get_stats():
+    with _lock:
+        return {
+            **rank_cache_stats,
+            "entries": len(_results),
+            "in_flight": len(_in_flight),
+            "ttl": RANK_CACHE_TTL,
+        }
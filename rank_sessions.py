@@ -0,0 +1,179 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+from threading import Lock
+
+from ai_summarizer import submit_dynamic_match_explanations, EXPLANATION_DEADLINE
+
+# ===============================
+# CONFIG
+# ===============================
+RANK_SESSION_TTL = float(os.getenv("RANK_SESSION_TTL", "900"))  # seconds
+MAX_RANK_SESSIONS = int(os.getenv("MAX_RANK_SESSIONS", "200"))
+STREAM_POLL_INTERVAL = 0.2  # seconds between checks for new explanations
+
+# ===============================
+# STATE
+# ===============================
+# session_id -> RankSession (in-process: a stream must hit the worker
+# that served the /rank call)
+sessions = {}
+# ranking_id -> Ranking, for paginated /rank (same caveat)
+rankings = {}
+sessions_lock = Lock()
+
+
+class RankSession:
+    """One /rank result whose explanations are generated in the background.
+
+    `events` grows as explanations finish (in completion order); a stream
+    resumes from any position in it.
+    """
+
+    def __init__(self, job_description, ranked):
+        self.session_id = uuid.uuid4().hex
+        self.job_description = job_description
+        self.ranked = [dict(item) for item in ranked]  # filled in as explanations land
+        self.created = time.monotonic()
+        self.events = []
+        self.finished = False
+        self._lock = Lock()
+        self._futures = []
+
+    def start_explanations(self, candidates):
+        """candidates align with self.ranked (see ai_summarizer)"""
+        self._futures = submit_dynamic_match_explanations(self.job_description, candidates)
+        if not self._futures:
+            self.finished = True
+        for rank, future in enumerate(self._futures):
+            future.add_done_callback(lambda f, rank=rank: self._on_done(rank, f))
+
+    def _on_done(self, rank, future):
+        explanation = None
+        if not future.cancelled() and future.exception() is None:
+            explanation = future.result()
+        item = self.ranked[rank]
+        item["match_explanation"] = explanation
+        with self._lock:
+            self.events.append({
+                "rank": rank + 1,
+                "student_id": item["student_id"],
+                "numeric_id": item["numeric_id"],
+                "match_explanation": explanation,
+            })
+            self.finished = len(self.events) == len(self._futures)
+
+    def expire_late(self):
+        """Give up on explanations past the deadline (they stream as null)"""
+        if self.finished or time.monotonic() - self.created < EXPLANATION_DEADLINE:
+            return
+        for future in self._futures:
+            future.cancel()
+
+    def expired(self):
+        return time.monotonic() - self.created > RANK_SESSION_TTL
+
+
+class Ranking:
+    """Full ordered result of a paginated /rank call.
+
+    Holds only ids and scores (attribute_table.hybrid_scores arrays);
+    documents and explanations are loaded per page as pages are requested.
+    """
+
+    def __init__(self, job_description, scored, section_scores=None):
+        self.ranking_id = uuid.uuid4().hex
+        self.job_description = job_description
+        self.scored = scored
+        self.section_scores = section_scores or {}
+        self.created = time.monotonic()
+
+    def __len__(self):
+        return len(self.scored["numeric_id"])
+
+    def page(self, cursor, page_size):
+        """(scored arrays for [cursor, cursor + page_size), next cursor or None)"""
+        end = cursor + page_size
+        page = {name: values[cursor:end] for name, values in self.scored.items()}
+        return page, (end if end < len(self) else None)
+
+    def expired(self):
+        return time.monotonic() - self.created > RANK_SESSION_TTL
+
+
+# ===============================
+# PUBLIC API
+# ===============================
+def _evict_unsafe(store):
+    for key in [key for key, s in store.items() if s.expired()]:
+        del store[key]
+    while len(store) >= MAX_RANK_SESSIONS:
+        del store[min(store, key=lambda key: store[key].created)]
+
+
+def create(job_description, ranked, candidates):
+    """Register a ranking and start explaining its candidates"""
+    session = RankSession(job_description, ranked)
+    with sessions_lock:
+        _evict_unsafe(sessions)
+        sessions[session.session_id] = session
+    session.start_explanations(candidates)
+    return session
+
+
+def get(session_id):
+    with sessions_lock:
+        session = sessions.get(session_id)
+    if session is None or session.expired():
+        return None
+    return session
+
+
+def create_ranking(job_description, scored, section_scores=None):
+    """Store a full ranking to be served page by page"""
+    ranking = Ranking(job_description, scored, section_scores)
+    with sessions_lock:
+        _evict_unsafe(rankings)
+        rankings[ranking.ranking_id] = ranking
+    return ranking
+
+
+def get_ranking(ranking_id):
+    with sessions_lock:
+        ranking = rankings.get(ranking_id)
+    if ranking is None or ranking.expired():
+        return None
+    return ranking
+
+
+def _sse(event, data, event_id=None):
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def stream(session, last_event_id=None):
+    """Server-Sent Events: one `explanation` event per candidate as it
+    finishes, then `done`. Event ids let EventSource resume after a reconnect."""
+    position = int(last_event_id) if last_event_id and last_event_id.isdigit() else 0
+    while True:
+        session.expire_late()
+        events = session.events[position:]
+        for event in events:
+            position += 1
+            yield _sse("explanation", event, event_id=position)
+        if session.finished and position >= len(session.events):
+            break
+        await asyncio.sleep(STREAM_POLL_INTERVAL)
+
+    missing = sum(1 for e in session.events if e["match_explanation"] is None)
+    yield _sse("done", {
+        "session_id": session.session_id,
+        "total": len(session.ranked),
+        "missing": missing,
+        "numeric_ids": [item["numeric_id"] for item in session.ranked],
+    })
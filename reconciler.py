@@ -0,0 +1,162 @@
+import os
+import time
+import numpy as np
+from threading import Lock, Thread, Event
+from datetime import datetime
+
+from db import (
+    get_indexed_numeric_ids,
+    get_embeddings_by_numeric_ids,
+    iter_student_embeddings,
+)
+from vector_engine import (
+    get_indexed_ids,
+    add_or_update_vectors,
+    remove_vectors,
+)
+
+# ===============================
+# CONFIG
+# ===============================
+RECONCILE_INTERVAL = float(os.getenv("RECONCILE_INTERVAL", "600"))  # seconds, 0 = on demand only
+RECONCILE_BATCH_SIZE = int(os.getenv("RECONCILE_BATCH_SIZE", "500"))
+
+_run_lock = Lock()
+_thread = None
+_wakeup = Event()
+_stop = Event()
+# Set while a re-embedding job runs: Mongo `embedding` may hold the old
+# model's vectors while FAISS already serves the new ones
+_paused = Event()
+
+# Students updated after this are re-upserted on the next run
+_watermark = datetime.utcnow()
+last_report = None
+
+
+def _batches(ids, size):
+    for i in range(0, len(ids), size):
+        yield ids[i:i + size]
+
+
+def _upsert(students):
+    if not students:
+        return 0
+    ids = [s["numeric_id"] for s in students]
+    if not add_or_update_vectors(ids, [s["embedding"] for s in students]):
+        raise RuntimeError(f"FAISS upsert failed for {len(ids)} students")
+    return len(ids)
+
+
+def reconcile(batch_size=RECONCILE_BATCH_SIZE):
+    """Diff FAISS ids against Mongo numeric_ids and repair only the delta.
+
+    - missing: in Mongo, not in FAISS -> embeddings fetched and upserted
+    - extra:   in FAISS, not in Mongo -> removed
+    - changed: updated in Mongo since the last run -> re-upserted
+    Repairs are applied through the batch API, `batch_size` at a time.
+    """
+    global _watermark, last_report
+    if _paused.is_set():
+        print("🔁 Reconcile skipped: paused while the embedding model is being swapped")
+        return {"started_at": datetime.utcnow(), "status": "paused", "errors": []}
+    with _run_lock:
+        started = time.monotonic()
+        run_at = datetime.utcnow()
+        report = {"started_at": run_at, "status": "success", "errors": []}
+
+        try:
+            index_ids = get_indexed_ids()
+            mongo_ids = np.array(get_indexed_numeric_ids(), dtype="int64")
+
+            missing = np.setdiff1d(mongo_ids, index_ids)
+            extra = np.setdiff1d(index_ids, mongo_ids)
+            report.update({
+                "index_count": int(len(index_ids)),
+                "mongo_count": int(len(mongo_ids)),
+                "missing": int(len(missing)),
+                "extra": int(len(extra)),
+            })
+
+            repaired = 0
+            for ids in _batches(missing.tolist(), batch_size):
+                repaired += _upsert(get_embeddings_by_numeric_ids(ids))
+
+            for ids in _batches(extra.tolist(), batch_size):
+                if not remove_vectors(ids):
+                    raise RuntimeError(f"FAISS remove failed for {len(ids)} students")
+                repaired += len(ids)
+
+            # Changed since last run (skipping ones just repaired as missing)
+            missing_set = set(missing.tolist())
+            changed = 0
+            batch = []
+            for student in iter_student_embeddings(since=_watermark, batch_size=batch_size):
+                if student["numeric_id"] in missing_set:
+                    continue
+                batch.append(student)
+                if len(batch) >= batch_size:
+                    changed += _upsert(batch)
+                    batch = []
+            changed += _upsert(batch)
+
+            report["changed"] = changed
+            report["repaired"] = repaired + changed
+            _watermark = run_at
+        except Exception as e:
+            report["status"] = "failed"
+            report["errors"].append(str(e))
+            print(f"Reconcile failed: {e}")
+
+        report["duration"] = round(time.monotonic() - started, 3)
+        last_report = report
+        print(
+            f"🔁 Reconcile {report['status']}: {report.get('missing', 0)} missing, "
+            f"{report.get('extra', 0)} extra, {report.get('changed', 0)} changed "
+            f"({report['duration']}s)"
+        )
+        return report
+
+
+def pause():
+    """Stop repairing FAISS from Mongo (waits for a run in progress)"""
+    _paused.set()
+    with _run_lock:
+        pass
+
+
+def resume():
+    _paused.clear()
+
+
+def request_run():
+    """Ask the background reconciler to run as soon as possible"""
+    _wakeup.set()
+
+
+def _loop():
+    while not _stop.is_set():
+        _wakeup.wait(RECONCILE_INTERVAL if RECONCILE_INTERVAL > 0 else None)
+        _wakeup.clear()
+        if _stop.is_set():
+            break
+        reconcile()
+
+
+def start():
+    """Start the periodic reconciler thread (idempotent)"""
+    global _thread
+    if _thread is not None and _thread.is_alive():
+        return
+    _stop.clear()
+    _thread = Thread(target=_loop, name="faiss-reconciler", daemon=True)
+    _thread.start()
+
+
+def stop():
+    global _thread
+    _stop.set()
+    _wakeup.set()
+    if _thread is not None:
+        _thread.join()
+        _thread = None
@@ -0,0 +1,319 @@
+import os
+import time
+from threading import Lock, Thread
+from datetime import datetime
+from pymongo import UpdateOne
+
+import embedding_service
+import reconciler
+import section_engine
+import vector_engine
+from db import (
+    students_collection,
+    reembed_jobs_collection,
+    set_active_embedding_model,
+    UPDATED_AT_MARGIN,
+)
+
+# ===============================
+# CONFIG
+# ===============================
+REEMBED_BATCH_SIZE = int(os.getenv("REEMBED_BATCH_SIZE", "256"))
+# Passes over students edited while the job ran, before building the index
+REEMBED_CATCH_UP_ROUNDS = int(os.getenv("REEMBED_CATCH_UP_ROUNDS", "3"))
+
+# Only the fields needed to rebuild profile and section texts
+REEMBED_PROJECTION = {
+    "_id": 0,
+    "numeric_id": 1,
+    "updated_at": 1,
+    "profile_text": 1,
+    "skills": 1,
+    "github": 1,
+    "ai_resume_summary": 1,
+    "ai_linkedin_summary": 1,
+    "ai_extracted_skills": 1,
+    "github_summary": 1,
+    "leetcode_summary": 1,
+    "resume_text_preview": 1,
+    "linkedin_text_preview": 1,
+}
+
+_thread = None
+_lock = Lock()
+
+
+# ===============================
+# TEXT
+# ===============================
+def profile_text_for(student):
+    """Stored profile text, or the closest reconstruction for students
+    registered before it was stored"""
+    if student.get("profile_text"):
+        return student["profile_text"]
+    summaries = " ".join(
+        student.get(field) or ""
+        for field in ("ai_resume_summary", "ai_linkedin_summary", "github_summary", "leetcode_summary")
+    )
+    languages = (student.get("github") or {}).get("primary_languages") or []
+    return f"{summaries} Skills: {' '.join(student.get('skills') or [])} {' '.join(languages)}".strip()
+
+
+# ===============================
+# JOB STATE (MONGO)
+# ===============================
+def _update_job(job_id, **fields):
+    fields["updated_at"] = datetime.utcnow()
+    reembed_jobs_collection.update_one({"_id": job_id}, {"$set": fields})
+
+
+def _get_or_create_job(model_name, tag):
+    job = reembed_jobs_collection.find_one({"_id": tag})
+    if job and job["status"] != "done":
+        print(f"♻️ Resuming re-embedding job for {tag} after numeric_id {job['last_numeric_id']}")
+        return job
+    now = datetime.utcnow()
+    job = {
+        "_id": tag,
+        "model": model_name,
+        "status": "running",
+        "last_numeric_id": 0,
+        "processed": 0,
+        "caught_up": 0,
+        "started_at": now,
+        "updated_at": now,
+        "finished_at": None,
+        "error": None,
+    }
+    reembed_jobs_collection.replace_one({"_id": tag}, job, upsert=True)
+    return job
+
+
+# ===============================
+# PASSES
+# ===============================
+def _batches(query, batch_size, sort=True):
+    cursor = students_collection.find(query, REEMBED_PROJECTION)
+    if sort:
+        cursor = cursor.sort("numeric_id", 1)
+    batch = []
+    for student in cursor.batch_size(batch_size):
+        batch.append(student)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _encode(students, model):
+    vectors = embedding_service.encode_profiles([profile_text_for(s) for s in students], model=model)
+    sections = section_engine.encode_sections([section_engine.section_texts(s) for s in students], model=model)
+    return vectors, sections
+
+
+def _write_next(students, model, tag):
+    """Store model-tagged vectors next to the live ones"""
+    vectors, sections = _encode(students, model)
+    students_collection.bulk_write([
+        UpdateOne({"numeric_id": s["numeric_id"]}, {"$set": {
+            "next_embedding": {"model": tag, "vector": vector.tolist()},
+            "next_section_embeddings": {name: v.tolist() for name, v in section.items()},
+        }})
+        for s, vector, section in zip(students, vectors, sections)
+    ], ordered=False)
+
+
+def _main_pass(job, model, tag, batch_size):
+    """Every student, in numeric_id order, checkpointing progress per batch"""
+    query = {"numeric_id": {"$gt": job["last_numeric_id"]}}
+    processed = job["processed"]
+    for students in _batches(query, batch_size):
+        _write_next(students, model, tag)
+        processed += len(students)
+        _update_job(job["_id"], last_numeric_id=students[-1]["numeric_id"], processed=processed)
+        print(f"   🔄 Re-embedded {processed} students (up to #{students[-1]['numeric_id']})")
+
+
+def _catch_up(job, model, tag, since, batch_size):
+    """Re-embed students edited (with the old model) after `since`"""
+    count = 0
+    query = {"numeric_id": {"$exists": True}, "updated_at": {"$gt": since - UPDATED_AT_MARGIN}}
+    for students in _batches(query, batch_size, sort=False):
+        _write_next(students, model, tag)
+        count += len(students)
+    _update_job(job["_id"], caught_up=job.get("caught_up", 0) + count)
+    job["caught_up"] = job.get("caught_up", 0) + count
+    return count
+
+
+def _next_records(tag):
+    cursor = students_collection.find(
+        {"next_embedding.model": tag},
+        {"_id": 0, "numeric_id": 1, "next_embedding.vector": 1}
+    ).batch_size(1000)
+    for s in cursor:
+        yield {"id": s["numeric_id"], "embedding": s["next_embedding"]["vector"]}
+
+
+def _next_section_records(tag):
+    cursor = students_collection.find(
+        {"next_embedding.model": tag},
+        {"_id": 0, "numeric_id": 1, "next_section_embeddings": 1}
+    ).batch_size(1000)
+    for s in cursor:
+        yield {"numeric_id": s["numeric_id"], "section_embeddings": s.get("next_section_embeddings") or {}}
+
+
+def _final_catch_up(tag, since, batch_size):
+    """After the swap: students edited while the side index was built were
+    indexed with stale vectors; re-embed them with the (now live) new model.
+
+    Returns (re-embedded, failed index updates).
+    """
+    count = 0
+    failed = 0
+    query = {"numeric_id": {"$exists": True}, "updated_at": {"$gt": since - UPDATED_AT_MARGIN}}
+    for students in _batches(query, batch_size, sort=False):
+        vectors, sections = _encode(students, None)
+        students_collection.bulk_write([
+            UpdateOne({"numeric_id": s["numeric_id"]}, {
+                "$set": {
+                    "embedding": vector.tolist(),
+                    "embedding_model": tag,
+                    "section_embeddings": {name: v.tolist() for name, v in section.items()},
+                },
+                "$unset": {"next_embedding": "", "next_section_embeddings": ""},
+            })
+            for s, vector, section in zip(students, vectors, sections)
+        ], ordered=False)
+        ids = [s["numeric_id"] for s in students]
+        if not vector_engine.add_or_update_vectors(ids, vectors) or not section_engine.upsert_many(ids, sections):
+            failed += len(ids)
+        count += len(students)
+    return count, failed
+
+
+# ===============================
+# JOB
+# ===============================
+def run(model_name, batch_size=REEMBED_BATCH_SIZE):
+    """Re-embed every student with `model_name` and swap it in.
+
+    1. Write model-tagged vectors next to the live ones (resumable by
+       numeric_id), then catch up students edited meanwhile.
+    2. Build side FAISS/section indexes from them and, in one step, swap
+       them in and switch the query encoder.
+    3. Promote the tagged vectors to `embedding` in Mongo and re-embed
+       anything edited during the build.
+    The reconciler is paused throughout: until step 3 it would write the
+    old model's `embedding` values into the new index.
+    """
+    tag = embedding_service.model_tag(model_name)
+    job = _get_or_create_job(model_name, tag)
+    started = time.monotonic()
+    reconciler.pause()
+    late_failed = 0
+
+    try:
+        model = embedding_service.load_model(model_name)
+        probe = embedding_service.encode_profiles(["dimension check"], model=model)
+        if probe.shape[1] != embedding_service.DIMENSION:
+            raise ValueError(f"{model_name} produces {probe.shape[1]}-d vectors, indexes expect {embedding_service.DIMENSION}")
+
+        print(f"\n🔁 Re-embedding students with {tag}...")
+        _update_job(tag, status="running", error=None)
+        _main_pass(job, model, tag, batch_size)
+
+        since = job["started_at"]
+        for _ in range(REEMBED_CATCH_UP_ROUNDS):
+            round_started = datetime.utcnow()
+            if not _catch_up(job, model, tag, since, batch_size):
+                break
+            since = round_started
+
+        _update_job(tag, status="building")
+        build_started = datetime.utcnow()
+        print("🏗️ Building side indexes...")
+        sections = section_engine.build_indexes(_next_section_records(tag))
+
+        def before_publish():
+            embedding_service.use_model(model_name, model)
+            section_engine.swap(sections)
+
+        _update_job(tag, status="swapping")
+        vector_engine.swap_in_index(
+            _next_records(tag),
+            before_publish=before_publish,
+            model={"name": model_name, "tag": tag},
+            after_persist=lambda: set_active_embedding_model(model_name, tag)
+        )
+
+        # Students edited during the build (or never updated_at-stamped ones,
+        # which $not/$gt also matches) - the former are redone below
+        cutoff = build_started - UPDATED_AT_MARGIN
+        students_collection.update_many(
+            {"next_embedding.model": tag, "updated_at": {"$not": {"$gt": cutoff}}},
+            [{"$set": {
+                "embedding": "$next_embedding.vector",
+                "section_embeddings": "$next_section_embeddings",
+                "embedding_model": tag,
+            }}]
+        )
+        students_collection.update_many(
+            {"next_embedding": {"$exists": True}, "updated_at": {"$not": {"$gt": cutoff}}},
+            {"$unset": {"next_embedding": "", "next_section_embeddings": ""}}
+        )
+        late, late_failed = _final_catch_up(tag, build_started, batch_size)
+        section_engine.save()
+
+        _update_job(
+            tag,
+            status="done",
+            finished_at=datetime.utcnow(),
+            duration=round(time.monotonic() - started, 3),
+            late_updates=late,
+            late_update_failures=late_failed
+        )
+        print(f"✅ Re-embedding with {tag} complete ({late} late updates re-applied, {late_failed} failed)")
+        return True
+    except Exception as e:
+        _update_job(tag, status="failed", error=str(e))
+        print(f"❌ Re-embedding with {tag} failed: {e}")
+        return False
+    finally:
+        reconciler.resume()
+        if late_failed:
+            # Mongo holds the new vectors; let the reconciler re-apply them
+            reconciler.request_run()
+
+
+def start(model_name):
+    """Start (or resume) a re-embedding job in the background"""
+    global _thread
+    with _lock:
+        if _thread is not None and _thread.is_alive():
+            raise ValueError("A re-embedding job is already running")
+        tag = embedding_service.model_tag(model_name)
+        unfinished = reembed_jobs_collection.find_one({"_id": tag, "status": {"$ne": "done"}})
+        if tag == embedding_service.model_tag() and not unfinished:
+            raise ValueError(f"{model_name} is already the active embedding model")
+        _thread = Thread(target=run, args=(model_name,), name="reembed", daemon=True)
+        _thread.start()
+    return status()
+
+
+def resume_interrupted():
+    """Restart a job that was running when the process stopped"""
+    job = reembed_jobs_collection.find_one({"status": {"$in": ["running", "building", "swapping"]}})
+    if job:
+        start(job["model"])
+
+
+def status():
+    job = reembed_jobs_collection.find_one(sort=[("started_at", -1)])
+    return {
+        "running": _thread is not None and _thread.is_alive(),
+        "active_model": embedding_service.model_tag(),
+        "job": job,
+    }
@@ -0,0 +1,426 @@
+import os
+import json
+import faiss
+import numpy as np
+from datetime import datetime
+from threading import Lock, Thread, Event
+
+import index_factory
+from embedding_service import encode_profiles
+
+# ===============================
+# CONFIG
+# ===============================
+# One vector (and one FAISS index) per profile section
+SECTIONS = ("resume", "linkedin", "github", "leetcode", "skills")
+
+# /rank fuses per-section similarities into the semantic score ("0" = use
+# the single profile vector only)
+FUSION_ENABLED = os.getenv("SECTION_FUSION", "1") == "1"
+
+SECTION_INDEX_DIR = os.getenv("SECTION_INDEX_DIR", "section_indexes")
+SECTION_STATE_FILE = os.path.join(SECTION_INDEX_DIR, "state.json")
+SECTION_SAVE_INTERVAL = float(os.getenv("SECTION_SAVE_INTERVAL", "300"))  # seconds
+# Search-only processes (same flag as vector_engine): open the writer's
+# saved files (IVF lists mapped), never build or write, and re-open them
+# when the writer saves again
+READ_ONLY = os.getenv("FAISS_READ_ONLY", "0") == "1"
+SECTION_RELOAD_INTERVAL = float(os.getenv("SECTION_RELOAD_INTERVAL", "30"))  # seconds
+
+# ===============================
+# STATE
+# ===============================
+# section -> index. Writers publish a modified copy, so searches never lock.
+indexes = {name: index_factory.new_index("flat") for name in SECTIONS}
+write_lock = Lock()
+_dirty = False
+_saver_thread = None
+_saver_stop = Event()
+_state_signature = None  # read-only: state file last loaded
+
+section_stats = {
+    "last_rebuild": None,
+    "last_save": None,
+    "caught_up": 0,
+    "update_failures": 0,
+}
+
+
+# ===============================
+# SECTION TEXTS / VECTORS
+# ===============================
+def _join(*parts):
+    return " ".join(str(p) for p in parts if p).strip()
+
+
+def section_texts(student):
+    """Per-section text for a student document (or registration data).
+
+    Uses full resume/LinkedIn text when available, falling back to the
+    stored previews. Sections with no content are left out.
+    """
+    github = student.get("github") or {}
+    languages = github.get("primary_languages") or list((github.get("languages") or {}).keys())
+    extracted = student.get("ai_extracted_skills") or {}
+    extracted_skills = [s for values in extracted.values() if isinstance(values, list) for s in values]
+
+    texts = {
+        "resume": _join(
+            student.get("ai_resume_summary"),
+            student.get("resume_text") or student.get("resume_text_preview")
+        ),
+        "linkedin": _join(
+            student.get("ai_linkedin_summary"),
+            student.get("linkedin_text") or student.get("linkedin_text_preview")
+        ),
+        "github": _join(
+            student.get("github_summary"),
+            f"Languages: {' '.join(languages)}" if languages else ""
+        ),
+        "leetcode": _join(student.get("leetcode_summary")),
+        "skills": _join(" ".join(student.get("skills") or []), " ".join(extracted_skills)),
+    }
+    return {name: text for name, text in texts.items() if text}
+
+
+def encode_sections(texts_per_student, model=None):
+    """[{section: text}] -> [{section: vector}] with one batched encode"""
+    flat = [(i, name, text) for i, texts in enumerate(texts_per_student) for name, text in texts.items()]
+    vectors = encode_profiles([text for _, _, text in flat], model=model)
+    result = [{} for _ in texts_per_student]
+    for (i, name, _), vector in zip(flat, vectors):
+        result[i][name] = vector
+    return result
+
+
+def to_document(section_vectors, prefix="section_embeddings"):
+    """Mongo $set fields for the given sections only (dotted keys), so an
+    update touches just the sections that changed"""
+    return {f"{prefix}.{name}": np.asarray(v, dtype="float32").tolist() for name, v in section_vectors.items()}
+
+
+# ===============================
+# LOAD / SAVE
+# ===============================
+def _index_path(name):
+    return os.path.join(SECTION_INDEX_DIR, f"{name}.index")
+
+
+def _read_state():
+    try:
+        with open(SECTION_STATE_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save():
+    """Write every section index and the catch-up watermark to disk"""
+    global _dirty
+    if READ_ONLY:
+        return
+    with write_lock:
+        snapshot = dict(indexes)
+        _dirty = False
+    saved_at = datetime.utcnow()
+
+    os.makedirs(SECTION_INDEX_DIR, exist_ok=True)
+    for name, index in snapshot.items():
+        tmp = _index_path(name) + ".tmp"
+        faiss.write_index(index, tmp)
+        os.replace(tmp, _index_path(name))
+
+    tmp = SECTION_STATE_FILE + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({
+            "saved_at": saved_at.isoformat(),
+            "counts": {name: int(index_factory.live_count(index)) for name, index in snapshot.items()}
+        }, f)
+    os.replace(tmp, SECTION_STATE_FILE)
+    section_stats["last_save"] = saved_at
+
+
+def build_indexes(records):
+    """Fresh section indexes from {"numeric_id", "section_embeddings"} records"""
+    ids = {name: [] for name in SECTIONS}
+    vectors = {name: [] for name in SECTIONS}
+    for record in records:
+        for name, vector in (record.get("section_embeddings") or {}).items():
+            if name in ids:
+                ids[name].append(record["numeric_id"])
+                vectors[name].append(vector)
+
+    built = {}
+    for name in SECTIONS:
+        matrix = np.array(vectors[name], dtype="float32").reshape(-1, index_factory.DIMENSION)
+        kind = index_factory.resolve_index_type(len(matrix))
+        built[name] = index_factory.build_index(kind, matrix, ids[name])
+    return built
+
+
+def load(section_records, changed_since=None, expected_counts=None):
+    """Load section indexes from disk and catch up, or rebuild from MongoDB.
+
+    `section_records()` streams every student's section vectors,
+    `changed_since(ts)` only those updated after ts, and `expected_counts()`
+    returns {section: n} for a final consistency check.
+    """
+    global indexes
+    if READ_ONLY:
+        _load_read_only()
+        start_saver()
+        return
+    state = _read_state()
+    loaded = None
+
+    if state and all(os.path.exists(_index_path(name)) for name in SECTIONS):
+        try:
+            loaded = {name: faiss.read_index(_index_path(name)) for name in SECTIONS}
+            if changed_since is not None:
+                since = datetime.fromisoformat(state["saved_at"])
+                changed = list(changed_since(since))
+                _upsert_into(loaded, [r["numeric_id"] for r in changed], [r.get("section_embeddings") or {} for r in changed])
+                section_stats["caught_up"] = len(changed)
+            if expected_counts is not None:
+                expected = expected_counts()
+                actual = {name: int(index_factory.live_count(index)) for name, index in loaded.items()}
+                if any(actual[name] != expected.get(name, 0) for name in SECTIONS):
+                    print(f"Section index counts {actual} != MongoDB {expected}. Rebuilding.")
+                    loaded = None
+        except Exception as e:
+            print(f"Could not load section indexes: {e}. Rebuilding.")
+            loaded = None
+
+    if loaded is None:
+        print("🧩 Building section indexes from MongoDB...")
+        loaded = build_indexes(section_records())
+        section_stats["last_rebuild"] = datetime.utcnow()
+        with write_lock:
+            indexes = loaded
+        save()
+    else:
+        with write_lock:
+            indexes = loaded
+
+    print("🧩 Section indexes ready: " + ", ".join(
+        f"{name}={index_factory.live_count(index)}" for name, index in indexes.items()
+    ))
+    start_saver()
+
+
+def _state_file_signature():
+    st = os.stat(SECTION_STATE_FILE)
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def _load_read_only():
+    """Open the writer's saved section indexes without ever modifying them"""
+    global indexes, _state_signature
+    if not os.path.exists(SECTION_STATE_FILE):
+        print(f"FAISS_READ_ONLY is set but {SECTION_STATE_FILE} does not exist yet.")
+        return False
+    try:
+        signature = _state_file_signature()
+        loaded = {
+            name: faiss.read_index(_index_path(name), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+            for name in SECTIONS
+        }
+    except Exception as e:
+        print(f"Could not open section indexes read-only: {e}")
+        return False
+    with write_lock:
+        indexes = loaded
+    _state_signature = signature
+    print("🧩 Section indexes opened read-only: " + ", ".join(
+        f"{name}={index_factory.live_count(index)}" for name, index in loaded.items()
+    ))
+    return True
+
+
+def _reload_if_changed():
+    """Read-only mode: pick up indexes saved since by the writer process"""
+    try:
+        if _state_file_signature() == _state_signature:
+            return
+    except OSError:
+        return
+    _load_read_only()
+
+
+# ===============================
+# MUTATE
+# ===============================
+def _upsert_into(target, numeric_ids, section_vectors):
+    """Upsert into `target` ({section: index}) in place"""
+    for name in SECTIONS:
+        ids = [i for i, vectors in zip(numeric_ids, section_vectors) if name in vectors]
+        if not ids:
+            continue
+        matrix = np.array(
+            [vectors[name] for vectors in section_vectors if name in vectors],
+            dtype="float32"
+        ).reshape(-1, index_factory.DIMENSION)
+        index_factory.remove_ids(target[name], ids)
+        target[name].add_with_ids(matrix, np.array(ids, dtype="int64"))
+        if index_factory.needs_compaction(target[name]):
+            target[name] = index_factory.rebuild(target[name])
+
+
+def upsert_many(numeric_ids, section_vectors):
+    """Add or replace vectors for the given sections only.
+
+    `section_vectors[i]` is {section: vector} for numeric_ids[i]; sections
+    not in it keep their current vector.
+    """
+    global _dirty
+    touched = {name for vectors in section_vectors for name in vectors}
+    if not touched:
+        return True
+    try:
+        if READ_ONLY:
+            raise RuntimeError("section indexes are read-only in this process (FAISS_READ_ONLY=1)")
+        with write_lock:
+            staged = {name: faiss.clone_index(indexes[name]) for name in touched}
+            _upsert_into(staged, numeric_ids, section_vectors)
+            indexes.update(staged)
+            _dirty = True
+        return True
+    except Exception as e:
+        section_stats["update_failures"] += 1
+        print(f"Section index update failed: {e}")
+        return False
+
+
+def upsert(numeric_id, section_vectors):
+    return upsert_many([numeric_id], [section_vectors])
+
+
+def remove_many(numeric_ids):
+    """Drop students from every section index"""
+    global _dirty
+    ids = np.asarray(numeric_ids, dtype="int64")
+    try:
+        if READ_ONLY:
+            raise RuntimeError("section indexes are read-only in this process (FAISS_READ_ONLY=1)")
+        with write_lock:
+            staged = {name: faiss.clone_index(index) for name, index in indexes.items()}
+            for index in staged.values():
+                index_factory.remove_ids(index, ids)
+            indexes.update(staged)
+            _dirty = True
+        return True
+    except Exception as e:
+        section_stats["update_failures"] += 1
+        print(f"Section index remove failed: {e}")
+        return False
+
+
+def remove(numeric_id):
+    return remove_many([numeric_id])
+
+
+def swap(built):
+    """Replace every section index with `built` (see build_indexes)"""
+    global indexes, _dirty
+    if READ_ONLY:
+        raise RuntimeError("section indexes are read-only in this process (FAISS_READ_ONLY=1)")
+    with write_lock:
+        indexes = dict(built)
+        _dirty = True
+    section_stats["last_rebuild"] = datetime.utcnow()
+
+
+# ===============================
+# SEARCH / LATE FUSION
+# ===============================
+def _hits(index, query, k, filter_ids=None):
+    if index.ntotal == 0 or k <= 0:
+        return {}
+    scores, ids = index_factory.search(index, query, min(k, index.ntotal), filter_ids=filter_ids)
+    return {int(i): float(s) for i, s in zip(ids[0], scores[0]) if i >= 0}
+
+
+def score(jd_embedding, candidate_ids, weights, top_k=0, filter_ids=None):
+    """Fuse per-section similarities for a job description.
+
+    Candidates are `candidate_ids` plus each section's own top_k hits (within
+    `filter_ids`). Every candidate's similarity in every section is then
+    computed exactly from its stored section vector (an ANN search would
+    miss most of them on IVF/HNSW) and combined with `weights`
+    ({section: weight}), renormalized over the sections the student has.
+
+    Returns {numeric_id: {"score": fused, "sections": {section: sim}}}.
+    """
+    query = np.asarray(jd_embedding, dtype="float32").reshape(1, -1)
+    snapshot = dict(indexes)
+
+    candidates = set(int(i) for i in candidate_ids)
+    if top_k:
+        for index in snapshot.values():
+            candidates.update(_hits(index, query, top_k, filter_ids=filter_ids))
+    if not candidates:
+        return {}
+    candidate_array = np.array(sorted(candidates), dtype="int64")
+
+    per_section = {}
+    for name, index in snapshot.items():
+        ids, vectors = index_factory.reconstruct_ids(index, candidate_array)
+        per_section[name] = dict(zip(ids.tolist(), (vectors @ query[0]).tolist()))
+
+    fused = {}
+    for numeric_id in candidate_array.tolist():
+        sims = {name: hits[numeric_id] for name, hits in per_section.items() if numeric_id in hits}
+        total_weight = sum(weights.get(name, 0) for name in sims)
+        if not sims or total_weight <= 0:
+            continue
+        fused[numeric_id] = {
+            "score": sum(weights.get(name, 0) * sim for name, sim in sims.items()) / total_weight,
+            "sections": sims,
+        }
+    return fused
+
+
+# ===============================
+# BACKGROUND SAVE
+# ===============================
+def _saver_loop():
+    interval = SECTION_RELOAD_INTERVAL if READ_ONLY else SECTION_SAVE_INTERVAL
+    while not _saver_stop.wait(interval):
+        if READ_ONLY:
+            _reload_if_changed()
+        elif _dirty:
+            try:
+                save()
+            except Exception as e:
+                print(f"Section index save failed: {e}")
+
+
+def start_saver():
+    global _saver_thread
+    interval = SECTION_RELOAD_INTERVAL if READ_ONLY else SECTION_SAVE_INTERVAL
+    if interval <= 0 or (_saver_thread is not None and _saver_thread.is_alive()):
+        return
+    _saver_stop.clear()
+    _saver_thread = Thread(target=_saver_loop, name="section-saver", daemon=True)
+    _saver_thread.start()
+
+
+def shutdown():
+    """Stop the saver and write pending changes"""
+    global _saver_thread
+    _saver_stop.set()
+    if _saver_thread is not None:
+        _saver_thread.join()
+        _saver_thread = None
+    if _dirty:
+        save()
+
+
+def get_stats():
+    snapshot = dict(indexes)
+    return {
+        **section_stats,
+        "sections": {name: int(index_factory.live_count(index)) for name, index in snapshot.items()},
+        "dirty": _dirty,
+        "read_only": READ_ONLY,
+    }
@@ -1,4 +1,5 @@
-from sentence_transformers import SentenceTransformer
+from embedding_service import encode_one
+from embedding_service import get_model as get_shared_model
 from db import save_student, remove_student, get_all_students
 from vector_engine import add_or_update_vector, remove_vector, match
 import logging
@@ -6,16 +7,9 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Lazy load model
-_model = None
-
 def get_model():
-    global _model
-    if _model is None:
-        logger.info("Loading SentenceTransformer model...")
-        _model = SentenceTransformer("all-MiniLM-L6-v2")
-        logger.info("Model loaded successfully.")
-    return _model
+    """Shared lazily-loaded model (see embedding_service)"""
+    return get_shared_model()
 
 def register_student(student_id, summary):
     """Register or update student profile"""
@@ -31,8 +25,7 @@ def register_student(student_id, summary):
     
     try:
         # Generate embedding
-        model = get_model()
-        embedding = model.encode(summary).tolist()
+        embedding = encode_one(summary).tolist()
         
         # Save to database (source of truth)
         save_student(student_id, summary, embedding)
@@ -87,8 +80,7 @@ def match_jd(jd_text, top_k=10):
     
     try:
         # Generate embedding
-        model = get_model()
-        jd_embedding = model.encode(jd_text).tolist()
+        jd_embedding = encode_one(jd_text).tolist()
         
         # Search FAISS
         results = match(jd_embedding, top_k=top_k)
@@ -0,0 +1,91 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+for _module in ("fastapi", "httpx", "multipart", "pymongo", "pandas", "openai", "dotenv",
+                "requests", "pdfplumber", "sentence_transformers"):
+    pytest.importorskip(_module)
+
+from fastapi.testclient import TestClient
+
+ROWS = [
+    {"name": "Asha", "branch": "CSE", "year": 3, "skills": "Python, SQL",
+     "github_username": "asha", "leetcode_username": "asha_lc"},
+    {"name": "Ravi", "branch": "ECE", "year": 2, "skills": "",
+     "github_username": None, "leetcode_username": None},
+]
+
+
+class FakeCollection:
+    def __init__(self):
+        self.documents = []
+
+    def insert_many(self, documents):
+        self.documents.extend(documents)
+
+    def delete_many(self, query):
+        ids = set(query["numeric_id"]["$in"])
+        self.documents = [d for d in self.documents if d["numeric_id"] not in ids]
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.environ.setdefault("OPENAI_API_KEY", "test")
+    import main
+    import section_engine
+
+    indexed = {}
+    collection = FakeCollection()
+    monkeypatch.setattr(main, "students_collection", collection)
+    monkeypatch.setattr(main, "fetch_github_data_for_ai", lambda username: {
+        "username": username,
+        "statistics": {"total_repos": 4, "total_stars": 10, "total_forks": 1},
+        "languages": {"Python": 3, "Go": 1},
+        "notable_projects": [],
+        "github_score": 42,
+        "profile_url": f"https://github.com/{username}"
+    })
+    monkeypatch.setattr(main, "fetch_leetcode_data_for_ai", lambda username: None)
+    monkeypatch.setattr(main, "reserve_numeric_ids", lambda count: list(range(101, 101 + count)))
+    monkeypatch.setattr(main, "encode_profiles", lambda texts: np.ones((len(texts), 384), dtype="float32"))
+    monkeypatch.setattr(section_engine, "encode_sections", lambda texts: [{} for _ in texts])
+    monkeypatch.setattr(section_engine, "upsert_many", lambda ids, vectors: None)
+    monkeypatch.setattr(main, "add_or_update_vectors", lambda ids, vectors: indexed.update(zip(ids, vectors)) or True)
+    return main, collection, indexed
+
+
+def _upload(main, rows):
+    client = TestClient(main.app)
+    return client.post("/bulk-upload", files={"file": ("students.json", json.dumps(rows), "application/json")})
+
+
+def test_bulk_upload_inserts_and_indexes_every_row(app):
+    main, collection, indexed = app
+
+    response = _upload(main, ROWS)
+
+    assert response.status_code == 200
+    assert response.json() == {"message": "2 students uploaded successfully"}
+    assert [d["numeric_id"] for d in collection.documents] == [101, 102]
+    assert sorted(indexed) == [101, 102]
+
+    asha, ravi = collection.documents
+    assert asha["github"]["github_score"] == 42
+    assert asha["leetcode"]["coding_score"] == 0
+    assert "Python" in asha["profile_text"]
+    assert ravi["github"]["languages"] == {}
+    assert len(asha["embedding"]) == 384
+    assert main.attribute_table.unknown_ids([101, 102]).size == 0
+
+
+def test_bulk_upload_rolls_back_when_indexing_fails(app, monkeypatch):
+    main, collection, _ = app
+    monkeypatch.setattr(main, "add_or_update_vectors", lambda ids, vectors: False)
+
+    response = _upload(main, ROWS)
+
+    assert response.status_code == 500
+    assert collection.documents == []
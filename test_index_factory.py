@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+import index_factory
+
+N_VECTORS = 5000
+TOP_K = 50
+
+
+def _corpus():
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((N_VECTORS, index_factory.DIMENSION)).astype("float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    ids = np.arange(1, N_VECTORS + 1, dtype="int64")
+    query = rng.standard_normal((1, index_factory.DIMENSION)).astype("float32")
+    query /= np.linalg.norm(query)
+    filter_ids = rng.choice(ids, 200, replace=False)
+    return vectors, ids, query, filter_ids
+
+
+def _expected(vectors, ids, query, filter_ids, k):
+    allowed = np.isin(ids, filter_ids)
+    sims = vectors[allowed] @ query[0]
+    return set(ids[allowed][np.argsort(-sims)[:k]].tolist())
+
+
+@pytest.mark.parametrize("kind", ["ivf_flat", "hnsw"])
+def test_filtered_search_fills_top_k(kind):
+    vectors, ids, query, filter_ids = _corpus()
+    index = index_factory.build_index(kind, vectors, ids)
+
+    scores, labels = index_factory.search(index, query, TOP_K, filter_ids=filter_ids)
+    found = labels[0][labels[0] >= 0]
+
+    assert len(found) == TOP_K
+    assert set(found.tolist()) <= set(filter_ids.tolist())
+    assert set(found.tolist()) == _expected(vectors, ids, query, filter_ids, TOP_K)
+    assert np.all(np.diff(scores[0]) <= 0)
+
+
+@pytest.mark.parametrize("kind", ["ivf_flat", "hnsw"])
+def test_large_filter_widens_search(kind, monkeypatch):
+    vectors, ids, query, filter_ids = _corpus()
+    index = index_factory.build_index(kind, vectors, ids)
+    monkeypatch.setattr(index_factory, "EXACT_FILTER_MAX_IDS", 0)
+
+    _, labels = index_factory.search(index, query, TOP_K, nprobe=1, ef_search=16, filter_ids=filter_ids)
+    found = labels[0][labels[0] >= 0]
+
+    assert len(found) == TOP_K
+    assert set(found.tolist()) <= set(filter_ids.tolist())
+
+
+def test_exact_search_skips_missing_ids():
+    vectors, ids, query, _ = _corpus()
+    index = index_factory.build_index("ivf_flat", vectors, ids)
+
+    _, labels = index_factory.search(index, query, 5, filter_ids=[1, 2, N_VECTORS + 10])
+
+    assert sorted(labels[0][labels[0] >= 0].tolist()) == [1, 2]
+    assert (labels[0] == -1).sum() == 3
@@ -0,0 +1,35 @@
+import os
+import pytest
+
+pytest.importorskip("onnxruntime")
+pytest.importorskip("transformers")
+SentenceTransformer = pytest.importorskip("sentence_transformers").SentenceTransformer
+
+from onnx_backend import OnnxEncoder
+
+# Minimum cosine similarity between PyTorch and ONNX embeddings
+TOLERANCE = {False: 0.999, True: 0.98}  # fp32, int8
+
+MODEL_NAME = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+
+TEXTS = [
+    "Python, SQL, Machine Learning, NLP project",
+    "Java, Spring Boot, Backend development",
+    "React, JavaScript, Frontend UI design",
+    "Looking for Machine Learning engineer with Python experience",
+    "Final year CSE student. " + "Built REST APIs and data pipelines. " * 40,  # > 256 tokens
+]
+
+
+@pytest.fixture(scope="module")
+def reference():
+    return SentenceTransformer(MODEL_NAME).encode(TEXTS, normalize_embeddings=True)
+
+
+@pytest.mark.parametrize("quantize", [False, True], ids=["fp32", "int8"])
+def test_onnx_matches_pytorch(reference, quantize):
+    onnx_vectors = OnnxEncoder(MODEL_NAME, quantize=quantize).encode(TEXTS, normalize_embeddings=True)
+    cosine = (reference * onnx_vectors).sum(axis=1)
+
+    assert onnx_vectors.shape == reference.shape
+    assert cosine.min() >= TOLERANCE[quantize], f"min cosine {cosine.min():.5f}"
@@ -0,0 +1,101 @@
+import os
+
+import numpy as np
+import pytest
+
+import index_factory
+import vector_engine
+
+
+def _vectors(n, seed=0):
+    return np.random.default_rng(seed).standard_normal((n, vector_engine.DIMENSION)).astype("float32")
+
+
+def _crash():
+    """Drop all in-memory state as if the process died (no final checkpoint)"""
+    if vector_engine.wal_file is not None:
+        vector_engine.wal_file.close()
+    vector_engine.index = None
+    vector_engine.wal_file = None
+    vector_engine.wal_records = 0
+    vector_engine._rebuild_capture = None
+
+
+def _ids():
+    return sorted(index_factory.get_ids(vector_engine.index).tolist())
+
+
+@pytest.fixture(autouse=True)
+def engine(tmp_path, monkeypatch):
+    index_file = str(tmp_path / "students.index")
+    monkeypatch.setattr(vector_engine, "INDEX_FILE", index_file)
+    monkeypatch.setattr(vector_engine, "WAL_FILE", index_file + ".wal")
+    monkeypatch.setattr(vector_engine, "MANIFEST_FILE", index_file + ".manifest.json")
+    monkeypatch.setattr(vector_engine, "READ_ONLY", False)
+    monkeypatch.setattr(vector_engine, "start_checkpointer", lambda: None)
+    _crash()
+    assert vector_engine.load_or_rebuild([])
+    yield
+    _crash()
+
+
+def test_wal_is_replayed_after_crash():
+    vector_engine.add_or_update_vectors([1, 2, 3, 4, 5], _vectors(5))
+    vector_engine.remove_vector(3)
+    _crash()
+
+    assert vector_engine.load_or_rebuild([])
+
+    assert _ids() == [1, 2, 4, 5]
+    assert vector_engine.faiss_stats["wal_replayed"] == 6
+    # The replayed tail is folded into a fresh checkpoint straight away
+    assert os.path.getsize(vector_engine.WAL_FILE) == 0
+
+
+def test_torn_final_record_is_ignored():
+    vector_engine.add_or_update_vectors([1, 2], _vectors(2))
+    _crash()
+    with open(vector_engine.WAL_FILE, "ab") as f:
+        f.write(vector_engine._WAL_HEADER.pack(vector_engine.WAL_OP_UPSERT, 3))
+        f.write(_vectors(1).tobytes()[:100])  # crash mid-append
+
+    assert vector_engine.load_or_rebuild([])
+
+    assert _ids() == [1, 2]
+    assert vector_engine.faiss_stats["wal_replayed"] == 2
+
+
+def test_crash_between_save_and_wal_truncate():
+    vector_engine.add_or_update_vectors([1, 2, 3], _vectors(3))
+    vector_engine.remove_vector(2)
+    vector_engine.save_index()
+    _crash()
+
+    assert vector_engine.load_or_rebuild([])
+
+    # Replaying records already in the checkpoint is idempotent
+    assert _ids() == [1, 3]
+    assert vector_engine.index.ntotal == 2
+
+
+def test_checkpoint_keeps_records_appended_during_save(monkeypatch):
+    vector_engine.add_or_update_vectors([1, 2], _vectors(2))
+    save_index = vector_engine.save_index
+
+    def save_with_concurrent_write(snapshot=None, watermark=None):
+        vector_engine.add_or_update_vector(3, _vectors(1, seed=1)[0])
+        save_index(snapshot, watermark)
+
+    monkeypatch.setattr(vector_engine, "save_index", save_with_concurrent_write)
+    assert vector_engine.checkpoint()
+
+    record_size = vector_engine._WAL_HEADER.size + vector_engine._WAL_VECTOR_BYTES
+    assert vector_engine.wal_records == 1
+    assert os.path.getsize(vector_engine.WAL_FILE) == record_size
+
+    monkeypatch.setattr(vector_engine, "save_index", save_index)
+    _crash()
+    assert vector_engine.load_or_rebuild([])
+
+    assert _ids() == [1, 2, 3]
+    assert vector_engine.faiss_stats["wal_replayed"] == 1
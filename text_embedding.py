@@ -1,8 +1,6 @@
-from sentence_transformers import SentenceTransformer
+from embedding_service import encode_many
 
 
-model = SentenceTransformer("all-MiniLM-L6-v2")
-
 # The sentences to encode
 jd = [
    "Looking for a Machine Learning engineer with Python experience"
@@ -12,13 +10,13 @@ students = [
     "Java, Spring Boot, Backend development, REST APIs",
     "React, JavaScript, Frontend development, UI design"
 ]
-# 2. Calculate embeddings by calling model.encode()
-student_embeddings = model.encode(students)
-jd_embeddings=model.encode(jd)
+# 2. Calculate (normalized) embeddings
+student_embeddings = encode_many(students)
+jd_embeddings=encode_many(jd)
 
 # [3, 384]
 
-# 3. Calculate the embedding similarities
-similarities = model.similarity( jd_embeddings,student_embeddings)
+# 3. Calculate the embedding similarities (cosine = dot product)
+similarities = jd_embeddings @ student_embeddings.T
 for i, score in enumerate(similarities[0]):
     print(f"Student {i+1} similarity score: {score:.4f}")
@@ -1,70 +1,571 @@
 import os
+import json
+import time
+import struct
 import faiss
 import numpy as np
-from threading import Lock
+from threading import Lock, Thread, Event
 from datetime import datetime
 
+import index_factory
+
 DIMENSION = 384
 INDEX_FILE = "students.index"
+
+# Copy-on-write: `index` is an immutable snapshot that readers search
+# without locking. Writers (serialized by index_lock) clone it, apply
+# their mutation to the clone and publish it by swapping the reference.
 index = None
+index_version = 0
 index_lock = Lock()
 
+# Search-only processes: serve the writer's checkpoint file, never write,
+# and re-open it whenever the writer checkpoints a new version. The file is
+# opened with IO_FLAG_MMAP, which FAISS only honours for IVF inverted lists:
+# those are shared by every worker through the page cache, while flat and
+# HNSW indexes are still read fully into each worker's heap. The writer
+# always keeps its own heap copy (it has to mutate it).
+READ_ONLY = os.getenv("FAISS_READ_ONLY", "0") == "1"
+index_mapped = False  # serving IVF lists straight from the mapped file
+
+# Embedding model the indexed vectors come from ({"name", "tag"}). It is
+# recorded in the manifest, and a file written for another model is never
+# loaded for this one.
+index_model = None
+# Read-only workers: called with the model name (under index_lock, right
+# before the new index is published) when the writer swapped in an index
+# built with another model, so the query encoder switches with it
+on_model_change = None
+# Read-only workers: called (outside index_lock) after a new checkpoint was
+# picked up, e.g. to refresh other per-process state the writer changed
+on_reload = None
+_index_file_signature = None
+
+# Manifest written next to every checkpoint: lets startup trust the file
+# and only fetch students changed in Mongo since `watermark` (the query
+# side looks back db.UPDATED_AT_MARGIN from it).
+MANIFEST_FILE = INDEX_FILE + ".manifest.json"
+REBUILD_CHUNK_SIZE = 5000
+
+# Write-ahead log: mutations are appended here and folded into INDEX_FILE
+# by the background checkpointer instead of rewriting the index each time.
+WAL_FILE = INDEX_FILE + ".wal"
+CHECKPOINT_INTERVAL = float(os.getenv("FAISS_CHECKPOINT_INTERVAL", "30"))  # seconds
+CHECKPOINT_MAX_RECORDS = int(os.getenv("FAISS_CHECKPOINT_MAX_RECORDS", "500"))
+# After a failed promotion/compaction, checkpoints skip it for this long
+RESTRUCTURE_RETRY_INTERVAL = float(os.getenv("FAISS_RESTRUCTURE_RETRY_INTERVAL", "600"))  # seconds
+
+WAL_OP_UPSERT = 1
+WAL_OP_REMOVE = 2
+_WAL_HEADER = struct.Struct("<Bq")  # op, student_id
+_WAL_VECTOR_BYTES = DIMENSION * 4   # float32 payload for upserts
+
+wal_file = None
+wal_records = 0
+_checkpoint_thread = None
+_checkpoint_lock = Lock()
+_checkpoint_wakeup = Event()
+_checkpoint_stop = Event()
+_restructure_retry_at = 0.0
+
+# Background rebuild: while it runs, committed mutations are also recorded
+# here so they can be replayed onto the fresh index before it is swapped in
+_rebuild_thread = None
+_rebuild_capture = None
+
 # Monitoring stats
 faiss_stats = {
     "last_rebuild": None,
+    "last_checkpoint": None,
+    "last_promotion": None,
     "add_failures": 0,
     "remove_failures": 0,
-    "search_count": 0
+    "search_count": 0,
+    "wal_replayed": 0,
+    "caught_up": 0,
+    "rebuild_in_progress": False,
+    "rebuild_started": None,
+    "rebuild_progress": 0,
+    "last_rebuild_duration": None,
+    "last_rebuild_status": None,
+    "checkpoint_failures": 0,
+    "restructure_failures": 0
 }
 
-def load_or_rebuild(student_records):
-    """Load FAISS index from disk or rebuild from database"""
-    global index
+def load_or_rebuild(student_records, changed_since=None, expected_count=None, model=None):
+    """Load FAISS index from disk (replaying the WAL tail) or rebuild from database.
+
+    student_records: iterable of {"id", "embedding"} records, or a zero-arg
+        callable returning one - only called when a rebuild is needed.
+    changed_since: optional callable(watermark) returning records updated in
+        Mongo after the manifest watermark; applied on top of a valid file.
+    expected_count: optional callable returning the number of students in
+        Mongo; a mismatch after catch-up forces a rebuild.
+    model: {"name", "tag"} of the query encoder; a file whose manifest
+        records another model is rebuilt (read-only: the encoder follows
+        the file via on_model_change instead).
+    """
+    global index, index_model, faiss_stats
+    if READ_ONLY:
+        index_model = model
+        return _load_read_only()
+    
     with index_lock:
-        if os.path.exists(INDEX_FILE):
+        loaded = False
+        manifest = _read_manifest()
+        same_model = model is None or _manifest_model_tag(manifest) == model["tag"]
+        index_model = model
+        if os.path.exists(INDEX_FILE) and _manifest_matches_file(manifest) and not same_model:
+            print(f"Index was built with embedding model {_manifest_model_tag(manifest)}, not {model['tag']}. Rebuilding...")
+        elif os.path.exists(INDEX_FILE) and _manifest_matches_file(manifest):
             try:
-                index = faiss.read_index(INDEX_FILE)
-                print(f"Loaded FAISS index from file ({index.ntotal} students).")
-                return True
+                loaded_index = faiss.read_index(INDEX_FILE)
+                replayed = _replay_wal_unsafe(loaded_index)
+                faiss_stats["wal_replayed"] = replayed
+                
+                # Catch up with Mongo writes that never reached this index
+                caught_up = 0
+                watermark = manifest["watermark"]
+                if changed_since is not None:
+                    watermark = datetime.utcnow().isoformat()
+                    caught_up = _apply_records(loaded_index, changed_since(_parse_time(manifest["watermark"])))
+                faiss_stats["caught_up"] = caught_up
+                
+                live = index_factory.live_count(loaded_index)
+                if expected_count is not None and expected_count() != live:
+                    raise ValueError(f"index has {live} students but database has {expected_count()}")
+                
+                _publish_unsafe(loaded_index)
+                print(f"Loaded FAISS index from file ({index.ntotal} students, {replayed} WAL records replayed, {caught_up} caught up from DB).")
+                loaded = True
             except Exception as e:
-                print(f"Index corrupted ({e}). Rebuilding...")
+                print(f"Index out of date or corrupted ({e}). Rebuilding...")
+        elif os.path.exists(INDEX_FILE):
+            print("Index does not match its manifest. Rebuilding...")
         
-        return _rebuild_index_unsafe(student_records)
+        if loaded:
+            _open_wal_unsafe()
+            if wal_records or caught_up:
+                # Fold the replayed tail into the checkpoint straight away
+                _checkpoint_unsafe(watermark)
+            success = True
+        else:
+            success = _rebuild_index_unsafe(student_records)
+    
+    start_checkpointer()
+    return success
+
+def _iter_record_chunks(student_records):
+    """Group streamed records into (ids, normalized vectors) chunks"""
+    if callable(student_records):
+        student_records = student_records()
+    ids, vectors = [], []
+    for student in student_records or []:
+        ids.append(student["id"])
+        vectors.append(student["embedding"])
+        if len(ids) >= REBUILD_CHUNK_SIZE:
+            yield _to_chunk(ids, vectors)
+            ids, vectors = [], []
+    if ids:
+        yield _to_chunk(ids, vectors)
+
+def _to_chunk(ids, vectors):
+    vectors = np.array(vectors, dtype="float32").reshape(-1, DIMENSION)
+    faiss.normalize_L2(vectors)
+    return np.array(ids, dtype="int64"), vectors
+
+def _apply_records(target, student_records):
+    """Upsert streamed records in place into an unpublished index"""
+    applied = 0
+    for ids, vectors in _iter_record_chunks(student_records):
+        index_factory.remove_ids(target, ids)
+        target.add_with_ids(vectors, ids)
+        applied += len(ids)
+    return applied
 
 def _rebuild_index_unsafe(student_records):
     """Rebuild index - MUST be called with lock held"""
     global index, faiss_stats
     
     try:
-        base = faiss.IndexFlatIP(DIMENSION)
-        index = faiss.IndexIDMap(base)
-        
-        if student_records:
-            vectors = []
-            ids = []
-            for student in student_records:
-                vectors.append(student["embedding"])
-                ids.append(student["id"])
-            
-            vectors = np.array(vectors).astype("float32")
-            faiss.normalize_L2(vectors)
-            index.add_with_ids(vectors, np.array(ids))
+        # Everything updated before the scan starts is reflected in the result
+        watermark = datetime.utcnow().isoformat()
+        _publish_unsafe(_build_from_records(student_records))
         
-        save_index()
+        # The rebuilt index reflects the database, so any logged tail is obsolete
+        _open_wal_unsafe()
+        _checkpoint_unsafe(watermark)
         faiss_stats["last_rebuild"] = datetime.now()
-        print(f"FAISS rebuilt from DB ({index.ntotal} students).")
+        print(f"FAISS rebuilt from DB ({index.ntotal} students, {index_factory.index_kind(index)} index).")
         return True
         
     except Exception as e:
         print(f"Failed to rebuild FAISS: {e}")
         return False
 
-def save_index():
-    """Atomically save index to disk"""
-    global index
+def _build_from_records(student_records):
+    """Build a fresh, unpublished index from streamed records"""
+    chunks = []
+    for chunk in _iter_record_chunks(student_records):
+        chunks.append(chunk)
+        faiss_stats["rebuild_progress"] += len(chunk[0])
+    ids = np.concatenate([c[0] for c in chunks]) if chunks else np.empty(0, dtype="int64")
+    vectors = np.vstack([c[1] for c in chunks]) if chunks else np.empty((0, DIMENSION), dtype="float32")
+    del chunks
+    
+    # IVF/PQ variants are trained on the stored Mongo embeddings here
+    kind = index_factory.resolve_index_type(len(vectors))
+    return index_factory.build_index(kind, vectors, ids)
+
+# =====================================================
+# MANIFEST
+# =====================================================
+
+def _parse_time(value):
+    return datetime.fromisoformat(value)
+
+def _read_manifest():
+    try:
+        with open(MANIFEST_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _manifest_matches_file(manifest):
+    """True when students.index is the file the manifest was written for.
+
+    Compares size and mtime rather than hashing the file, so the check
+    costs the same for any corpus size. The writer still reads the whole
+    index into memory at startup.
+    """
+    if not manifest:
+        return False
+    try:
+        st = os.stat(INDEX_FILE)
+        return st.st_size == manifest["size"] and st.st_mtime_ns == manifest["mtime_ns"]
+    except (OSError, KeyError):
+        return False
+
+def _manifest_model_tag(manifest):
+    return ((manifest or {}).get("embedding_model") or {}).get("tag")
+
+def _write_manifest(snapshot, watermark):
+    ids = index_factory.get_ids(snapshot)
+    manifest = {
+        "embedding_model": index_model,
+        "count": int(len(ids)),
+        "max_numeric_id": int(ids.max()) if len(ids) else 0,
+        "watermark": watermark,
+        "index_type": index_factory.index_kind(snapshot),
+        "size": os.stat(INDEX_FILE).st_size,
+        "mtime_ns": os.stat(INDEX_FILE).st_mtime_ns,
+        "written_at": datetime.utcnow().isoformat()
+    }
+    temp_file = MANIFEST_FILE + ".tmp"
+    with open(temp_file, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(temp_file, MANIFEST_FILE)
+
+def save_index(snapshot=None, watermark=None):
+    """Atomically save index (or the given snapshot) to disk, plus its manifest"""
+    snapshot = snapshot if snapshot is not None else index
     temp_file = INDEX_FILE + ".tmp"
-    faiss.write_index(index, temp_file)
+    faiss.write_index(snapshot, temp_file)
     os.replace(temp_file, INDEX_FILE)
+    _write_manifest(snapshot, watermark or datetime.utcnow().isoformat())
+
+def _publish_unsafe(next_index, mapped=False):
+    """Swap in a new index version - MUST be called with lock held"""
+    global index, index_version, index_mapped
+    index = next_index
+    index_mapped = mapped
+    index_version += 1
+
+def _file_signature():
+    st = os.stat(INDEX_FILE)
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+def _read_mapped():
+    """(index, mapped) for the checkpoint file; only IVF lists are mapped"""
+    global _index_file_signature
+    _index_file_signature = _file_signature()
+    mapped_index = faiss.read_index(INDEX_FILE, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    return mapped_index, index_factory.index_kind(mapped_index) in ("ivf_flat", "ivf_pq")
+
+def _publish_checkpoint_unsafe():
+    """Read-only mode: publish the writer's current file, switching the
+    query encoder first if it was built with another model - MUST be called
+    with lock held. False while the file and manifest are mid-update."""
+    global index_model
+    manifest = _read_manifest()
+    if not _manifest_matches_file(manifest):
+        return False
+    file_model = manifest.get("embedding_model")
+    if file_model and index_model and file_model["tag"] != index_model["tag"]:
+        print(f"Writer swapped embedding model to {file_model['tag']}.")
+        if on_model_change is not None:
+            on_model_change(file_model["name"])
+    _publish_unsafe(*_read_mapped())
+    index_model = file_model or index_model
+    return True
+
+def _load_read_only():
+    """Serve the writer's checkpointed file without ever modifying it.
+
+    The reload loop is started either way: when the file is missing or
+    mid-checkpoint it keeps retrying until the writer's file shows up.
+    """
+    start_checkpointer()
+    if not os.path.exists(INDEX_FILE):
+        print(f"FAISS_READ_ONLY is set but {INDEX_FILE} does not exist yet, waiting for the writer.")
+        return False
+    with index_lock:
+        if not _publish_checkpoint_unsafe():
+            print(f"{INDEX_FILE} does not match its manifest yet, waiting for the writer.")
+            return False
+    print(f"Opened FAISS index read-only ({index.ntotal} students, {'mapped' if index_mapped else 'in memory'}).")
+    return True
+
+def _reload_if_changed():
+    """Read-only mode: pick up a new checkpoint written by the writer process"""
+    try:
+        if not os.path.exists(INDEX_FILE) or _file_signature() == _index_file_signature:
+            return
+        with index_lock:
+            if not _publish_checkpoint_unsafe():
+                return  # manifest not written yet, retry next round
+        print(f"Re-opened FAISS index after external checkpoint ({index.ntotal} students).")
+        if on_reload is not None:
+            on_reload()
+    except Exception as e:
+        print(f"FAISS re-map failed: {e}")
+
+def _apply_unsafe(op, ids, vectors=None):
+    """Build the next index version with a mutation applied, log it, publish it.
+
+    MUST be called with lock held. The current snapshot is never modified,
+    so in-flight searches are unaffected and a failure leaves it intact.
+    """
+    if READ_ONLY:
+        raise RuntimeError("FAISS index is read-only in this process (FAISS_READ_ONLY=1)")
+    
+    next_index = faiss.clone_index(index)
+    index_factory.remove_ids(next_index, ids)
+    if op == WAL_OP_UPSERT:
+        next_index.add_with_ids(vectors, ids)
+    _append_wal_unsafe(op, ids, vectors)
+    _publish_unsafe(next_index)
+    if _rebuild_capture is not None:
+        _rebuild_capture.append((op, np.array(ids), None if vectors is None else np.array(vectors)))
+
+def get_index_version():
+    """Monotonic counter bumped every time a new index version is published"""
+    return index_version
+
+# =====================================================
+# WRITE-AHEAD LOG
+# =====================================================
+
+def _open_wal_unsafe():
+    """Open the WAL for appending - MUST be called with lock held"""
+    global wal_file
+    if wal_file is None:
+        wal_file = open(WAL_FILE, "ab")
+
+def _append_wal_unsafe(op, student_ids, vectors=None):
+    """Append one record per id with a single fsync - MUST be called with lock held"""
+    global wal_records
+    records = []
+    for i, student_id in enumerate(student_ids):
+        records.append(_WAL_HEADER.pack(op, int(student_id)))
+        if op == WAL_OP_UPSERT:
+            records.append(np.asarray(vectors[i], dtype="float32").tobytes())
+    wal_file.write(b"".join(records))
+    wal_file.flush()
+    os.fsync(wal_file.fileno())
+    wal_records += len(student_ids)
+    if wal_records >= CHECKPOINT_MAX_RECORDS:
+        _checkpoint_wakeup.set()
+
+def _replay_wal_unsafe(target):
+    """Apply logged mutations in place on a freshly loaded, unpublished index.
+
+    Records are idempotent (upsert = remove + add), so replaying a tail that
+    was already folded into the checkpoint is harmless. A torn record at the
+    end (crash mid-append) is ignored.
+    """
+    global wal_records
+    if not os.path.exists(WAL_FILE):
+        return 0
+    
+    with open(WAL_FILE, "rb") as f:
+        data = f.read()
+    
+    replayed = 0
+    offset = 0
+    while offset + _WAL_HEADER.size <= len(data):
+        op, student_id = _WAL_HEADER.unpack_from(data, offset)
+        offset += _WAL_HEADER.size
+        ids = np.array([student_id])
+        if op == WAL_OP_UPSERT:
+            if offset + _WAL_VECTOR_BYTES > len(data):
+                break
+            vector = np.frombuffer(data, dtype="float32", count=DIMENSION, offset=offset).reshape(1, DIMENSION)
+            offset += _WAL_VECTOR_BYTES
+            index_factory.remove_ids(target, ids)
+            target.add_with_ids(vector, ids)
+        elif op == WAL_OP_REMOVE:
+            index_factory.remove_ids(target, ids)
+        else:
+            print(f"Unknown WAL op {op} at byte {offset}, ignoring rest of log.")
+            break
+        replayed += 1
+    
+    wal_records = replayed
+    return replayed
+
+def _checkpoint_unsafe(watermark=None):
+    """Write the full index and truncate the WAL - MUST be called with lock held"""
+    global wal_records, faiss_stats
+    save_index(watermark=watermark)
+    wal_file.truncate(0)
+    wal_file.flush()
+    os.fsync(wal_file.fileno())
+    wal_records = 0
+    faiss_stats["last_checkpoint"] = datetime.now()
+
+def _drop_wal_prefix_unsafe(cut_offset, cut_records):
+    """Discard WAL records up to cut_offset, keeping any appended since - MUST be called with lock held"""
+    global wal_file, wal_records
+    with open(WAL_FILE, "rb") as f:
+        f.seek(cut_offset)
+        tail = f.read()
+    temp_file = WAL_FILE + ".tmp"
+    with open(temp_file, "wb") as f:
+        f.write(tail)
+        f.flush()
+        os.fsync(f.fileno())
+    wal_file.close()
+    os.replace(temp_file, WAL_FILE)
+    wal_file = open(WAL_FILE, "ab")
+    wal_records -= cut_records
+
+def _replay_capture_unsafe(next_index):
+    """Apply writes captured during a background build - MUST be called with lock held"""
+    for op, ids, vectors in _rebuild_capture:
+        index_factory.remove_ids(next_index, ids)
+        if op == WAL_OP_UPSERT:
+            next_index.add_with_ids(vectors, ids)
+    return len(_rebuild_capture)
+
+def _maybe_restructure():
+    """Promote flat -> ANN past the size threshold, or compact HNSW tombstones.
+
+    Like the background rebuild, the new index is trained and built from a
+    snapshot outside index_lock; writes made meanwhile are captured and
+    replayed onto it before it is published.
+    """
+    global _rebuild_capture, faiss_stats
+    snapshot = index
+    if snapshot is None or time.monotonic() < _restructure_retry_at:
+        return
+    if index_factory.should_promote(snapshot):
+        kind = index_factory.resolve_index_type(index_factory.live_count(snapshot))
+    elif index_factory.needs_compaction(snapshot):
+        kind = None
+    else:
+        return
+    
+    with index_lock:
+        if _rebuild_capture is not None:
+            return  # a rebuild is running and will replace the index anyway
+        snapshot = index
+        _rebuild_capture = []
+    
+    try:
+        if kind:
+            print(f"FAISS corpus reached {snapshot.ntotal} students, promoting flat index to {kind}...")
+        next_index = index_factory.rebuild(snapshot, kind)
+        with index_lock:
+            _replay_capture_unsafe(next_index)
+            _rebuild_capture = None
+            _publish_unsafe(next_index)
+        if kind:
+            faiss_stats["last_promotion"] = datetime.now()
+    except Exception:
+        with index_lock:
+            _rebuild_capture = None
+        raise
+
+def checkpoint(force=False, watermark=None):
+    """Fold pending WAL records into the on-disk index.
+
+    The snapshot is serialized outside index_lock, so neither searches nor
+    writers wait on the disk write; records appended meanwhile stay in the WAL.
+    force writes the current version even with an empty WAL (after a rebuild).
+    """
+    global faiss_stats, _restructure_retry_at
+    with _checkpoint_lock:
+        if wal_records or force:
+            # A failed rebuild (e.g. OOM while training) must not keep the
+            # WAL from being folded: checkpoint the current index anyway
+            try:
+                _maybe_restructure()
+            except Exception as e:
+                faiss_stats["restructure_failures"] += 1
+                _restructure_retry_at = time.monotonic() + RESTRUCTURE_RETRY_INTERVAL
+                print(f"FAISS promotion/compaction failed, retrying in {RESTRUCTURE_RETRY_INTERVAL:.0f}s: {e}")
+        try:
+            with index_lock:
+                if index is None or wal_file is None or (wal_records == 0 and not force):
+                    return True
+                snapshot = index
+                cut_offset = wal_file.tell()
+                cut_records = wal_records
+                watermark = watermark or datetime.utcnow().isoformat()
+            
+            save_index(snapshot, watermark)
+            
+            with index_lock:
+                _drop_wal_prefix_unsafe(cut_offset, cut_records)
+            faiss_stats["last_checkpoint"] = datetime.now()
+            return True
+        except Exception as e:
+            faiss_stats["checkpoint_failures"] += 1
+            print(f"FAISS checkpoint failed: {e}")
+            return False
+
+def _checkpoint_loop():
+    while not _checkpoint_stop.is_set():
+        _checkpoint_wakeup.wait(CHECKPOINT_INTERVAL)
+        _checkpoint_wakeup.clear()
+        if READ_ONLY:
+            _reload_if_changed()
+        else:
+            checkpoint()
+
+def start_checkpointer():
+    """Start the background checkpoint thread (idempotent)"""
+    global _checkpoint_thread
+    if _checkpoint_thread is not None and _checkpoint_thread.is_alive():
+        return
+    _checkpoint_stop.clear()
+    _checkpoint_thread = Thread(target=_checkpoint_loop, name="faiss-checkpoint", daemon=True)
+    _checkpoint_thread.start()
+
+def shutdown():
+    """Stop the checkpointer and write a final checkpoint"""
+    global _checkpoint_thread, wal_file
+    _checkpoint_stop.set()
+    _checkpoint_wakeup.set()
+    if _checkpoint_thread is not None:
+        _checkpoint_thread.join()
+        _checkpoint_thread = None
+    checkpoint()
+    with index_lock:
+        if wal_file is not None:
+            wal_file.close()
+            wal_file = None
 
 def add_or_update_vector(student_id, embedding):
     """Add or update student vector in FAISS"""
@@ -76,15 +577,12 @@ def add_or_update_vector(student_id, embedding):
     
     with index_lock:
         try:
-            # 🟡 FIX 2: Removed unnecessary try-except
-            # FAISS remove_ids() is safe even if ID doesn't exist
-            index.remove_ids(np.array([student_id]))
-            
-            # Add new vector
             vector = np.array([embedding]).astype("float32")
             faiss.normalize_L2(vector)
-            index.add_with_ids(vector, np.array([student_id]))
-            save_index()
+            
+            # 🟡 FIX 2: Removed unnecessary try-except
+            # FAISS remove_ids() is safe even if ID doesn't exist
+            _apply_unsafe(WAL_OP_UPSERT, np.array([student_id]), vector)
             return True
             
         except Exception as e:
@@ -103,60 +601,230 @@ def remove_vector(student_id):
     with index_lock:
         try:
             # 🟡 FIX 2: Direct call without nested try-except
-            index.remove_ids(np.array([student_id]))
-            save_index()
+            _apply_unsafe(WAL_OP_REMOVE, np.array([student_id]))
             return True
         except Exception as e:
             faiss_stats["remove_failures"] += 1
             print(f"FAISS remove failed for student {student_id}: {e}")
             return False
 
-def match(jd_embedding, top_k=10):
-    """Find top K matching students for JD"""
+def add_or_update_vectors(student_ids, embeddings):
+    """Add or update many student vectors as one index version and one WAL fsync.
+
+    embeddings is an (n, 384) array-like aligned with student_ids. If an id
+    appears more than once the last row wins.
+    """
+    global index, faiss_stats
+    
+    if index is None:
+        raise RuntimeError("FAISS index not initialized. Call load_or_rebuild() first.")
+    
+    ids = np.asarray(student_ids, dtype="int64").reshape(-1)
+    vectors = np.array(embeddings, dtype="float32").reshape(-1, DIMENSION)
+    if len(ids) != len(vectors):
+        raise ValueError(f"Got {len(ids)} ids for {len(vectors)} embeddings")
+    if len(ids) == 0:
+        return True
+    
+    # Keep the last occurrence of each id
+    _, last = np.unique(ids[::-1], return_index=True)
+    keep = np.sort(len(ids) - 1 - last)
+    ids, vectors = ids[keep], np.ascontiguousarray(vectors[keep])
+    faiss.normalize_L2(vectors)
+    
+    with index_lock:
+        try:
+            _apply_unsafe(WAL_OP_UPSERT, ids, vectors)
+            return True
+        except Exception as e:
+            faiss_stats["add_failures"] += len(ids)
+            print(f"FAISS batch update failed for {len(ids)} students: {e}")
+            return False
+
+def remove_vectors(student_ids):
+    """Remove many student vectors as one index version and one WAL fsync"""
     global index, faiss_stats
     
-    # 🔴 FIX 1: Check if index initialized
     if index is None:
         raise RuntimeError("FAISS index not initialized. Call load_or_rebuild() first.")
     
+    ids = np.unique(np.asarray(student_ids, dtype="int64").reshape(-1))
+    if len(ids) == 0:
+        return True
+    
     with index_lock:
-        if index.ntotal == 0:
-            return []
-        
-        top_k = min(top_k, index.ntotal)
-        vector = np.array([jd_embedding]).astype("float32")
-        faiss.normalize_L2(vector)
-        
-        scores, ids = index.search(vector, top_k)
-        faiss_stats["search_count"] += 1
-        
+        try:
+            _apply_unsafe(WAL_OP_REMOVE, ids)
+            return True
+        except Exception as e:
+            faiss_stats["remove_failures"] += len(ids)
+            print(f"FAISS batch remove failed for {len(ids)} students: {e}")
+            return False
+
+def match(jd_embedding, top_k=10, nprobe=None, ef_search=None, filter_ids=None):
+    """Find top K matching students for JD.
+
+    nprobe (IVF) / ef_search (HNSW) trade recall for latency on this query
+    only; they are ignored for flat indexes. filter_ids restricts the search
+    to those students, so top_k is filled from matching students only: on
+    IVF/HNSW small filter sets are searched exactly and larger ones widen
+    nprobe/ef_search by their selectivity (see index_factory.search).
+    """
+    return match_batch([jd_embedding], top_k=top_k, nprobe=nprobe, ef_search=ef_search, filter_ids=filter_ids)[0]
+
+def match_batch(jd_embeddings, top_k=10, nprobe=None, ef_search=None, filter_ids=None):
+    """Find top K matching students for each JD with a single multi-row search"""
+    global faiss_stats
+    
+    # Lock-free: grab the current snapshot; writers never mutate it
+    snapshot = index
+    
+    # 🔴 FIX 1: Check if index initialized
+    if snapshot is None:
+        raise RuntimeError("FAISS index not initialized. Call load_or_rebuild() first.")
+    
+    vectors = np.array(jd_embeddings, dtype="float32").reshape(-1, DIMENSION)
+    candidates = snapshot.ntotal if filter_ids is None else min(len(filter_ids), snapshot.ntotal)
+    if candidates == 0 or len(vectors) == 0:
+        return [[] for _ in range(len(vectors))]
+    
+    top_k = min(top_k, candidates)
+    faiss.normalize_L2(vectors)
+    
+    scores, ids = index_factory.search(snapshot, vectors, top_k, nprobe=nprobe, ef_search=ef_search, filter_ids=filter_ids)
+    faiss_stats["search_count"] += len(vectors)
+    
+    all_results = []
+    for row_scores, row_ids in zip(scores, ids):
         results = []
-        for score, sid in zip(scores[0], ids[0]):
-            if sid == -1:
+        for score, sid in zip(row_scores, row_ids):
+            if sid < 0:
                 continue
             results.append({
                 "student_id": int(sid),
                 "score": float(score)
             })
-        return results
+        all_results.append(results)
+    return all_results
+
+def get_indexed_ids():
+    """All student ids in the current snapshot"""
+    snapshot = index
+    if snapshot is None:
+        raise RuntimeError("FAISS index not initialized. Call load_or_rebuild() first.")
+    return index_factory.get_ids(snapshot)
 
 def get_stats():
     """Get FAISS statistics"""
-    global index, faiss_stats
+    global faiss_stats
     
     # 🟡 FIX 3: Calculate total_students dynamically (removed from faiss_stats dict)
-    with index_lock:
-        stats = faiss_stats.copy()
-        stats["total_students"] = index.ntotal if index else 0
-        return stats
+    snapshot = index
+    stats = faiss_stats.copy()
+    stats["total_students"] = index_factory.live_count(snapshot) if snapshot else 0
+    stats["index_type"] = index_factory.index_kind(snapshot) if snapshot else None
+    stats["index_version"] = index_version
+    stats["wal_records"] = wal_records
+    stats["mmap"] = index_mapped
+    stats["read_only"] = READ_ONLY
+    return stats
 
-def force_rebuild_from_db(student_records):
-    """Emergency rebuild - use if FAISS corrupted"""
+def force_rebuild_from_db(student_records, wait=False):
+    """Emergency rebuild - use if FAISS corrupted.
+
+    Builds a fresh index in a background thread while searches and writes
+    keep using the current one, replays writes made meanwhile onto it and
+    swaps it in atomically. Returns False if a rebuild is already running;
+    with wait=True, blocks and returns whether the rebuild succeeded.
+    """
+    global _rebuild_thread, _rebuild_capture, faiss_stats
     print("🚨 Force rebuilding FAISS from database...")
+    
     with index_lock:
-        success = _rebuild_index_unsafe(student_records)
-    if success:
-        print("✅ Rebuild successful!")
-    else:
-        print("❌ Rebuild failed!")
-    return success
\ No newline at end of file
+        if READ_ONLY:
+            print("❌ Rebuild refused: FAISS index is read-only in this process.")
+            return False
+        if _rebuild_capture is not None or (_rebuild_thread is not None and _rebuild_thread.is_alive()):
+            print("⏳ Rebuild already in progress.")
+            return False
+        
+        # Start capturing before the scan so no write can fall in between
+        _rebuild_capture = []
+        faiss_stats["rebuild_in_progress"] = True
+        faiss_stats["rebuild_started"] = datetime.now()
+        faiss_stats["rebuild_progress"] = 0
+        _rebuild_thread = Thread(
+            target=_background_rebuild,
+            args=(student_records,),
+            name="faiss-rebuild",
+            daemon=True
+        )
+        _rebuild_thread.start()
+    
+    if wait:
+        _rebuild_thread.join()
+        return faiss_stats["last_rebuild_status"] == "success"
+    return True
+
+def swap_in_index(student_records, before_publish=None, model=None, after_persist=None):
+    """Build a side index from student_records and swap it in for the live one.
+
+    Unlike force_rebuild_from_db, writes made while it builds are NOT
+    replayed: this is for vectors from a different model (`model`), which
+    must not be mixed with the live ones. Under index_lock, in one step:
+    before_publish() (e.g. switch the query encoder), publish, checkpoint
+    (manifest records `model`, the old WAL is dropped), after_persist()
+    (e.g. record the active model in Mongo). A crash before the checkpoint
+    restarts on the old file; after it, the manifest's model no longer
+    matches the old active model, so startup rebuilds instead of serving
+    new-model vectors to the old encoder.
+    """
+    global index_model, faiss_stats
+    if READ_ONLY:
+        raise RuntimeError("FAISS index is read-only in this process (FAISS_READ_ONLY=1)")
+    if _rebuild_thread is not None and _rebuild_thread.is_alive():
+        raise RuntimeError("A FAISS rebuild is already running")
+    
+    watermark = datetime.utcnow().isoformat()
+    next_index = _build_from_records(student_records)
+    # _checkpoint_lock: a promotion/compaction in flight must not publish
+    # its (old-model) index after this one
+    with _checkpoint_lock, index_lock:
+        if before_publish is not None:
+            before_publish()
+        _publish_unsafe(next_index)
+        index_model = model if model is not None else index_model
+        _checkpoint_unsafe(watermark)
+        if after_persist is not None:
+            after_persist()
+    faiss_stats["last_rebuild"] = datetime.now()
+    print(f"✅ Swapped in side index ({next_index.ntotal} students).")
+    return True
+
+def _background_rebuild(student_records):
+    global _rebuild_capture, faiss_stats
+    started = time.monotonic()
+    watermark = datetime.utcnow().isoformat()
+    try:
+        next_index = _build_from_records(student_records)
+        
+        with index_lock:
+            captured = _replay_capture_unsafe(next_index)
+            _rebuild_capture = None
+            _publish_unsafe(next_index)
+        
+        # Persist the new version; until this lands, a restart still sees
+        # the old file plus a WAL that reproduces the same state
+        checkpoint(force=True, watermark=watermark)
+        
+        faiss_stats["last_rebuild"] = datetime.now()
+        faiss_stats["last_rebuild_status"] = "success"
+        print(f"✅ Rebuild successful! ({next_index.ntotal} students, {captured} concurrent writes replayed)")
+    except Exception as e:
+        with index_lock:
+            _rebuild_capture = None
+        faiss_stats["last_rebuild_status"] = f"failed: {e}"
+        print(f"❌ Rebuild failed! {e}")
+    finally:
+        faiss_stats["rebuild_in_progress"] = False
+        faiss_stats["last_rebuild_duration"] = round(time.monotonic() - started, 3)